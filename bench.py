@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import compare
+import engine
+import schema
+
+# ==========================================
+# ベンチマーク
+# ==========================================
+# 使い方:
+#   python bench.py                          # 全ベンチマークを実行して表示
+#   python bench.py --save bench.json        # 結果を保存
+#   python bench.py --compare bench.json     # 保存済みの結果と比べ、遅くなっていれば終了コード1
+#
+# - rerun_*   : Streamlit の AppTest で opp.py をスクリプトごと再実行した時間
+# - calc_*    : engine だけで N シナリオを一括計算した時間
+# - json_*    : 設定JSONの保存(書き出し)・読込(検証込み)の時間
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opp.py")
+DEFAULT_THRESHOLD = 1.2  # --compare で「遅くなった」とみなす比率
+
+
+def measure(fn, rounds, warmup=1):
+    """fn を warmup 回空回ししてから rounds 回計測し、統計を返す (pytest-benchmark と同じ項目)"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {
+        "rounds": rounds,
+        "min": min(times),
+        "max": max(times),
+        "mean": statistics.mean(times),
+        "median": statistics.median(times),
+        "stddev": statistics.stdev(times) if rounds > 1 else 0.0,
+    }
+
+
+def bench_rerun(rounds):
+    """スクリプト全体の再実行 (入力変更なし / 入力変更あり)"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.run()
+    results = {"rerun_noop": measure(at.run, rounds)}
+
+    state = {"v": engine.default_values["ex_visitors"]}
+
+    def rerun_with_change():
+        state["v"] += 10
+        at.number_input(key="ex_visitors").set_value(state["v"])
+        at.run()
+
+    results["rerun_input_change"] = measure(rerun_with_change, rounds)
+    return results
+
+
+def _scenario_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = engine.to_frame([engine.default_values])
+    frame = pd.DataFrame(np.repeat(frame.to_numpy(), n, axis=0), columns=frame.columns)
+    for k in engine.NUMERIC_KEYS:
+        frame[k] *= rng.uniform(0.8, 1.2, n)
+    return frame
+
+
+def bench_calc(sizes, rounds):
+    """engine.evaluate による N シナリオ一括計算"""
+    results = {}
+    for n in sizes:
+        frame = _scenario_frame(n)
+        stats = measure(lambda: engine.evaluate(frame), rounds)
+        stats["scenarios_per_sec"] = n / stats["median"]
+        results[f"calc_{n}"] = stats
+    return results
+
+
+def bench_json(rounds, n_files=100):
+    """設定JSONの保存 (json.dumps) と読込 (検証・正規化込み)"""
+    config = schema.tag(schema.defaults_copy())
+    config["custom_events"] = [{"name": f"イベント{i}", "inc": 10000 * i, "exp": 5000 * i, "memo": ""}
+                               for i in range(20)]
+    raw = json.dumps(config, ensure_ascii=False, indent=2).encode("utf-8")
+    files = [(f"scenario{i}.json", raw) for i in range(n_files)]
+    return {
+        "json_save": measure(lambda: json.dumps(config, ensure_ascii=False, indent=2), rounds * 10),
+        "json_load": measure(lambda: schema.validate(json.loads(raw)), rounds * 10),
+        f"json_load_{n_files}_files": measure(lambda: compare.load_configs(files), rounds),
+    }
+
+
+def run(rounds=5, sizes=(1_000, 100_000), skip_rerun=False):
+    results = {}
+    if not skip_rerun:
+        results.update(bench_rerun(rounds))
+    results.update(bench_calc(sizes, rounds))
+    results.update(bench_json(rounds))
+    return results
+
+
+def format_table(results, baseline=None):
+    rows = []
+    for name, st in results.items():
+        row = {"name": name, "median_ms": st["median"] * 1000, "min_ms": st["min"] * 1000,
+               "stddev_ms": st["stddev"] * 1000, "rounds": st["rounds"]}
+        if "scenarios_per_sec" in st:
+            row["scenarios/s"] = f"{st['scenarios_per_sec']:,.0f}"
+        if baseline and name in baseline:
+            row["ratio"] = st["median"] / baseline[name]["median"]
+        rows.append(row)
+    return pd.DataFrame(rows).to_string(index=False, na_rep="", float_format=lambda x: f"{x:.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BIGLABO シミュレーターのベンチマーク")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000], help="一括計算のシナリオ数")
+    parser.add_argument("--skip-rerun", action="store_true", help="AppTest による再実行計測を省く")
+    parser.add_argument("--save", help="結果をJSONで保存するパス")
+    parser.add_argument("--compare", help="比較する保存済みJSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="--compare で中央値がこの倍率を超えたら失敗にする")
+    args = parser.parse_args(argv)
+
+    results = run(args.rounds, args.sizes, args.skip_rerun)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print(format_table(results, baseline))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        slower = [name for name, st in results.items()
+                  if name in baseline and st["median"] > baseline[name]["median"] * args.threshold]
+        if slower:
+            print(f"遅くなった項目 (×{args.threshold}超): {', '.join(slower)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import compare
+import engine
+import schema
+
+# ==========================================
+# コマンドライン一括計算 (Streamlit 不要)
+# ==========================================
+# 使い方:
+#   python cli.py 札幌20260401.json 函館20260401.json -o result.xlsx
+#   python cli.py configs/ plans.zip -o result.csv --workers 4
+#   python cli.py scenarios.csv -o result.parquet --format wide
+#
+# 計算の前に全入力を一度検証し、誤りのあるファイルが1つでもあれば
+# すべてのエラーを表示して何も書き出さずに終了する (--skip-invalid で誤りを飛ばして続行)。
+# 別のフォルダ・zip に同じ名前のファイルがあれば、2つ目以降を「名前 (2)」のように区別する。
+#
+# 入力はチャンク単位で読み込み・計算・書き出しを行うので、
+# シナリオ数が増えてもメモリ使用量はチャンクサイズ分で頭打ちになる。
+
+DEFAULT_CHUNK_SIZE = 5000
+EXCEL_MAX_ROWS = 1_000_000  # 1シートの行数上限 (超えたら次のシートへ)
+TABLE_EXTENSIONS = (".csv", ".parquet")
+CONFIG_EXTENSIONS = (".json", ".zip")
+OUTPUT_EXTENSIONS = (".csv", ".parquet", ".xlsx")
+
+
+# --- 入力 ---
+def _expand_paths(paths):
+    """ディレクトリは中の json / zip / csv / parquet に展開する"""
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(CONFIG_EXTENSIONS + TABLE_EXTENSIONS):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def _read_table_chunks(path, chunk_size, errors, taken):
+    """CSV / Parquet を1行1シナリオとしてチャンクごとに読む (シナリオ名は taken と重ならないようにする)"""
+    if path.lower().endswith(".csv"):
+        chunks = pd.read_csv(path, chunksize=chunk_size)
+    else:
+        import pyarrow.parquet as pq
+        chunks = (b.to_pandas() for b in pq.ParquetFile(path).iter_batches(batch_size=chunk_size))
+    stem = os.path.splitext(os.path.basename(path))[0]
+    offset = 0
+    for chunk in chunks:
+        if "scenario" in chunk:
+            chunk = chunk.set_index("scenario")
+        else:
+            chunk.index = [f"{stem}:{i}" for i in range(offset, offset + len(chunk))]
+        offset += len(chunk)
+        chunk.index = [compare.unique_name(str(n), taken) for n in chunk.index]
+        chunk.index.name = "scenario"
+        chunk, errs = schema.validate_frame(chunk)  # 誤りのある行は計算に回さない
+        errors.update(errs)
+        yield chunk
+
+
+def iter_scenario_chunks(paths, chunk_size=DEFAULT_CHUNK_SIZE, errors=None, exclude=None, warnings=None):
+    """入力ファイル群から、INPUT_KEYS 列を持つシナリオ DataFrame をチャンクごとに返す。
+
+    読み込めない設定ファイル・表の行は errors ({シナリオ名: [...]}) に記録して飛ばす。
+    版の移行などの注意は warnings に記録する。
+    exclude (出力先など) のファイルは入力に含めない。
+    """
+    errors = {} if errors is None else errors
+    warnings = {} if warnings is None else warnings
+    skip = {os.path.abspath(p) for p in exclude or []}
+    # 出力先がフォルダ内にあっても、書き出し中のファイル自身は読まない
+    files = [p for p in _expand_paths(paths) if os.path.abspath(p) not in skip]
+    pending = {}
+    taken = set()  # ファイルをまたいで同じシナリオ名 (別フォルダの plan.json など) を区別する
+    for path in files:
+        if path.lower().endswith(TABLE_EXTENSIONS):
+            if pending:  # 先に読んだ設定ファイルを先に出す (出力を入力の順に並べる)
+                yield _configs_frame(pending)
+                pending = {}
+            yield from _read_table_chunks(path, chunk_size, errors, taken)
+            continue
+        with open(path, "rb") as f:
+            configs, errs, warns = compare.load_configs([(os.path.basename(path), f.read())], taken)
+        errors.update(errs)
+        warnings.update(warns)
+        pending.update(configs)
+        if len(pending) >= chunk_size:
+            yield _configs_frame(pending)
+            pending = {}
+    if pending:
+        yield _configs_frame(pending)
+
+
+def check_inputs(paths, chunk_size=DEFAULT_CHUNK_SIZE, exclude=None):
+    """計算せずに全入力を検証だけして、(エラー, 注意, シナリオ数) を返す"""
+    errors, warnings = {}, {}
+    n = sum(len(c) for c in iter_scenario_chunks(paths, chunk_size, errors, exclude, warnings))
+    return errors, warnings, n
+
+
+def _configs_frame(configs):
+    frame = engine.to_frame(list(configs.values()))
+    frame.index = pd.Index(list(configs), name="scenario")
+    return frame
+
+
+# --- 計算 ---
+def evaluate_chunk(frame, fmt="detail"):
+    """1チャンク分を計算する。detail は df_detail と同じカテゴリ別の縦持ち、wide は1行1シナリオ"""
+    results = engine.evaluate(frame)
+    if fmt == "wide":
+        return results.reset_index()
+    return engine.category_frame(results)
+
+
+def _bounded_map(pool, fn, items, max_pending, *args):
+    """pool.map と同じ順序で結果を返すが、同時に投入するのは max_pending 件まで"""
+    queue = deque()
+    for item in items:
+        queue.append(pool.submit(fn, item, *args))
+        if len(queue) >= max_pending:
+            yield queue.popleft().result()
+    while queue:
+        yield queue.popleft().result()
+
+
+def iter_results(chunks, fmt="detail", workers=None):
+    """チャンクを逐次またはプロセスプールで計算し、順番に返す"""
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from _bounded_map(pool, evaluate_chunk, chunks, workers * 2, fmt)
+    else:
+        for chunk in chunks:
+            yield evaluate_chunk(chunk, fmt)
+
+
+# --- 出力 ---
+def write_results(results, out_path):
+    """結果のチャンクを拡張子 (csv / parquet / xlsx) に応じて逐次書き出し、行数を返す"""
+    ext = os.path.splitext(out_path)[1].lower()
+    if ext == ".csv":
+        return _write_csv(results, out_path)
+    if ext == ".parquet":
+        return _write_parquet(results, out_path)
+    if ext == ".xlsx":
+        return _write_excel(results, out_path)
+    raise ValueError(f"未対応の出力形式です: {ext} (csv / parquet / xlsx)")
+
+
+def _write_csv(results, out_path):
+    rows = 0
+    with open(out_path, "w", encoding="utf-8-sig", newline="") as f:
+        for i, chunk in enumerate(results):
+            chunk.to_csv(f, header=(i == 0), index=False)
+            rows += len(chunk)
+    return rows
+
+
+def _write_parquet(results, out_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    rows = 0
+    writer = None
+    try:
+        for chunk in results:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, table.schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def _write_excel(results, out_path):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)  # 行を溜めずにストリーミングで書く
+    ws, sheet_rows, rows, header = None, 0, 0, None
+    for chunk in results:
+        header = list(chunk.columns)
+        for record in chunk.itertuples(index=False):
+            if ws is None or sheet_rows >= EXCEL_MAX_ROWS:
+                ws = wb.create_sheet(f"結果{len(wb.worksheets) + 1}")
+                ws.append(header)
+                sheet_rows = 0
+            ws.append(list(record))
+            sheet_rows += 1
+            rows += 1
+    if ws is None:
+        wb.create_sheet("結果1").append(header or engine.DETAIL_COLUMNS)
+    wb.save(out_path)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BIGLABO 収支シミュレーションの一括計算")
+    parser.add_argument("inputs", nargs="+", help="設定JSON / zip / CSV / Parquet、またはそれらを含むフォルダ")
+    parser.add_argument("-o", "--output", required=True, help="出力ファイル (.csv / .parquet / .xlsx)")
+    parser.add_argument("--format", choices=["detail", "wide"], default="detail",
+                        help="detail: カテゴリ別明細 (既定) / wide: 1行1シナリオ")
+    parser.add_argument("--workers", type=int, default=None, help="並列プロセス数 (省略時は逐次)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1回に計算するシナリオ数")
+    parser.add_argument("--skip-invalid", action="store_true",
+                        help="誤りのあるファイル・行を飛ばして残りを計算する (既定では何も書き出さずに終了)")
+    args = parser.parse_args(argv)
+    # 全入力の検証に時間をかける前に、引数の誤りを知らせる
+    if os.path.splitext(args.output)[1].lower() not in OUTPUT_EXTENSIONS:
+        parser.error(f"未対応の出力形式です: {args.output} ({' / '.join(OUTPUT_EXTENSIONS)})")
+    missing = [p for p in args.inputs if not os.path.exists(p)]
+    if missing:
+        parser.error(f"入力が見つかりません: {', '.join(missing)}")
+
+    # 1回目: 全入力を検証だけする (誤りは途中で止めずに全部集める)
+    errors, warnings, n = check_inputs(args.inputs, args.chunk_size, exclude=[args.output])
+    for name, warns in warnings.items():
+        print(f"注意: {name}: " + " / ".join(warns), file=sys.stderr)
+    for name, errs in errors.items():
+        print(f"読み込みエラー: {name}: " + " / ".join(errs), file=sys.stderr)
+    if errors and not args.skip_invalid:
+        print(f"{len(errors)}件のシナリオに誤りがあるため中止しました (--skip-invalid で誤りを飛ばして計算します)。",
+              file=sys.stderr)
+        return 1
+
+    # 2回目: 検証済みの入力を計算して書き出す
+    chunks = iter_scenario_chunks(args.inputs, args.chunk_size, exclude=[args.output])
+    rows = write_results(iter_results(chunks, args.format, args.workers), args.output)
+    print(f"{n}シナリオ・{rows}行を {args.output} に書き出しました。", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import io
+import json
+import os
+import zipfile
+
+import pandas as pd
+
+import engine
+import schema
+
+# ==========================================
+# 複数シナリオの一括比較
+# ==========================================
+# 保存済みの設定JSON (複数ファイル または zip) をまとめて読み込み、
+# schema で検証・版の移行をしてから engine で一括計算する。
+
+
+def read_files(files):
+    """(ファイル名, バイト列) の並びから JSON を読み出す。zip は中の .json を展開する。
+
+    戻り値は (シナリオ名, dict または None, エラー一覧) のリスト。
+    """
+    entries = []
+    for name, raw in files:
+        if name.lower().endswith(".zip"):
+            try:
+                with zipfile.ZipFile(io.BytesIO(raw)) as zf:
+                    members = sorted(n for n in zf.namelist() if n.lower().endswith(".json"))
+                    entries.extend(read_files((n, zf.read(n)) for n in members))
+            except zipfile.BadZipFile:
+                entries.append((name, None, ["zipファイルとして読み込めません"]))
+            continue
+        scenario = os.path.splitext(os.path.basename(name))[0]
+        try:
+            data = json.loads(raw.decode("utf-8-sig"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            entries.append((scenario, None, [f"JSONとして読み込めません: {e}"]))
+            continue
+        entries.append((scenario, data, []))
+    return entries
+
+
+def unique_name(scenario, taken):
+    """taken にない名前を返して taken に加える (重なれば「名前 (2)」のように番号を付ける)"""
+    name = scenario
+    i = 2
+    while name in taken:
+        name = f"{scenario} ({i})"
+        i += 1
+    taken.add(name)
+    return name
+
+
+def load_configs(files, taken=None):
+    """ファイル群を読み込んで検証し、(設定 {シナリオ名: 設定}, エラー {シナリオ名: [...]}, 注意 {シナリオ名: [...]}) を返す。
+
+    1ファイルの誤りで止めず、全ファイルのエラーをまとめて返す。
+    同じシナリオ名は「名前 (2)」のように番号を付けて区別する。何回かに分けて読むときは
+    使用済みの名前の set を taken に渡すと、呼び出しをまたいで区別する (taken は更新される)。
+    """
+    configs, errors, warnings = {}, {}, {}
+    taken = set() if taken is None else taken
+    for scenario, data, errs in read_files(files):
+        name = unique_name(scenario, taken)
+        if data is not None:
+            cfg, errs, warns = schema.validate(data)
+            if warns:
+                warnings[name] = warns
+        if errs:
+            errors[name] = errs
+        else:
+            configs[name] = cfg
+    return configs, errors, warnings
+
+
+def evaluate_configs(configs):
+    """{シナリオ名: 設定} を一括計算し、シナリオ名を index にした結果 DataFrame を返す"""
+    frame = engine.to_frame(list(configs.values()))
+    frame.index = pd.Index(list(configs), name="scenario")
+    return engine.evaluate(frame)
+
+
+def side_by_side(results, value="収支差益"):
+    """カテゴリを行、シナリオを列にした比較表を作る (value は 収入/支出/収支差益)"""
+    long = engine.category_frame(results)
+    table = long.pivot(index="項目", columns="scenario", values=value)
+    order = list(engine.CATEGORY_LABELS.values()) + [engine.TOTAL_LABEL]
+    return table.reindex(order)[list(results.index)]
+
+
+def deltas(results, baseline, value="収支差益"):
+    """基準シナリオとの差分 (カテゴリ × シナリオ) を返す"""
+    table = side_by_side(results, value)
+    return table.sub(table[baseline], axis=0)
@@ -0,0 +1,294 @@
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# BIGLABO 収支計算エンジン (Streamlit非依存)
+# ==========================================
+# opp.py の画面と同じ計算式を、スカラー(1プラン)でも
+# NumPy配列(Nシナリオ一括)でも評価できるようにまとめたもの。
+
+# --- デフォルト値の定義 ---
+default_values = {
+    "creator_name": "担当者",
+    # 基礎収支
+    "inc_manage": 10000000, "inc_misc": 100000,
+    "exp_wages": 5200000, "exp_utility": 1300000, "exp_maint": 1100000,
+    "exp_ops_base": 1440000, "exp_insurance": 100000,
+    # 施設利用
+    "atelier_price": 10000, "atelier_rate": 80,
+    "ground_price": 300, "ground_count": 100,
+    "memo_facility": "（例）アトリエは満室稼働を目指す。",
+    # あそびっグラボ
+    "asobi_price_daily": 300, "asobi_price_annual": 3000,
+    "asobi_daily_users": 500, "asobi_annual_users": 50, "asobi_mat_cost": 50000,
+    "memo_asobi": "（例）土日祝のみ開館想定。",
+    # ショップ
+    "sales_agri": 50000, "rate_agri": 10,
+    "sales_craft": 100000, "rate_craft": 20,
+    "sales_art": 50000, "rate_art": 30,
+    "gacha_units": 2, "gacha_per_day": 3,
+    "ws_users": 500, "ws_price": 500, "ws_mat_rate": 30,
+    "memo_shop": "（例）農産物は地元農家5軒と契約予定。",
+    # 宿泊
+    "camp_groups": 50, "camp_price": 15000, "camp_option": 100000,
+    "night_staff_cost": 5000, "camp_maint_cost": 50000,
+    "memo_camp": "（例）繁忙期は8月と10月を想定。",
+    # 企画展
+    "ex_visitors": 1000, "ex_fee": 500,
+    "ex_rental_cost": 50000, "ex_mat_cost": 30000,
+    "ex_ad_cost": 50000, "ex_vol_count": 5,
+    "memo_ex": "（例）春は「猫展」、秋は「恐竜展」を実施。",
+    # 施設の定数 (施設ごとに異なる値)
+    "atelier_rooms": 7, "gacha_price": 500, "gacha_days": 250,
+    "gacha_cost_rate": 80, "volunteer_cost": 10000,
+    # イベントリスト
+    "custom_events": []
+}
+
+# 計算に使う数値パラメータ (default_values のうち int のもの)
+NUMERIC_KEYS = [k for k, v in default_values.items() if isinstance(v, int)]
+
+# カスタムイベントの合計は custom_events から集計して渡す
+# (カテゴリを指定したイベントはそのカテゴリの収支に加算し、未指定は custom に入れる)
+EVENT_CATEGORIES = ["asobi", "facility", "shop", "camp", "ex", "custom"]
+
+
+def event_key(category, side):
+    """イベント合計の入力キー (side は "inc" / "exp")"""
+    return f"custom_{side}" if category == "custom" else f"event_{category}_{side}"
+
+
+EVENT_KEYS = [event_key(c, s) for c in EVENT_CATEGORIES for s in ("inc", "exp")]
+INPUT_KEYS = NUMERIC_KEYS + EVENT_KEYS
+
+# 画面上の項目名 (感度分析などで使う)
+PARAM_LABELS = {
+    "inc_manage": "指定管理料", "inc_misc": "雑収入",
+    "exp_wages": "人件費", "exp_utility": "光熱水費", "exp_maint": "修繕・通信",
+    "exp_ops_base": "事務運営費", "exp_insurance": "保険料",
+    "atelier_price": "アトリエ 1部屋月額", "atelier_rate": "アトリエ入居率(%)",
+    "ground_price": "グランド単価", "ground_count": "グランド年間利用回数",
+    "asobi_price_daily": "あそび 1日利用料", "asobi_price_annual": "あそび 年パス料金",
+    "asobi_daily_users": "あそび 年間利用者数", "asobi_annual_users": "あそび 年パス購入者数",
+    "asobi_mat_cost": "あそび 材料費",
+    "sales_agri": "農産物 売上(月)", "rate_agri": "農産物 手数料(%)",
+    "sales_craft": "工芸品 売上(月)", "rate_craft": "工芸品 手数料(%)",
+    "sales_art": "美術品 売上(月)", "rate_art": "美術品 手数料(%)",
+    "gacha_units": "ガチャ台数", "gacha_per_day": "ガチャ回転/日",
+    "ws_users": "WS利用者数/年", "ws_price": "WS単価", "ws_mat_rate": "WS材料費率(%)",
+    "camp_groups": "宿泊 利用組数/年", "camp_price": "宿泊単価", "camp_option": "宿泊 オプション収入",
+    "night_staff_cost": "夜間手当/回", "camp_maint_cost": "宿泊 設備維持費",
+    "ex_visitors": "企画展 有料入場者数", "ex_fee": "企画展 観覧料",
+    "ex_rental_cost": "企画展 作品賃借料", "ex_mat_cost": "企画展 材料費",
+    "ex_ad_cost": "企画展 広告宣伝費", "ex_vol_count": "企画展 ボランティア人数",
+    "atelier_rooms": "アトリエ部屋数", "gacha_price": "ガチャ単価", "gacha_days": "ガチャ稼働日数/年",
+    "gacha_cost_rate": "ガチャ原価率(%)", "volunteer_cost": "ボランティア謝礼/人",
+}
+
+# 0〜100(%) の範囲をとるパラメータ
+PERCENT_KEYS = ["atelier_rate", "rate_agri", "rate_craft", "rate_art", "ws_mat_rate", "gacha_cost_rate"]
+
+# 入力の取りうる範囲 (画面のスライダー上限に合わせる。None は上限なし)
+PARAM_BOUNDS = {k: (0, None) for k in NUMERIC_KEYS}
+PARAM_BOUNDS.update({k: (0, 100) for k in PERCENT_KEYS})
+PARAM_BOUNDS.update({
+    "asobi_daily_users": (0, 5000),
+    "asobi_annual_users": (0, 2000),
+    "gacha_per_day": (0, 30),
+})
+
+# 入力欄で受け付ける範囲 (保存ファイルの検証にも使う)。
+# 画面の入力欄に min/max があるものだけ制限する (None は制限なし。マイナスの金額も入力できる)
+INPUT_BOUNDS = {k: (None, None) for k in NUMERIC_KEYS}
+INPUT_BOUNDS.update({
+    # スライダー
+    "asobi_daily_users": (0, 5000), "asobi_annual_users": (0, 2000),
+    "atelier_rate": (0, 100), "gacha_per_day": (0, 30),
+    # 手数料率
+    "rate_agri": (0, 100), "rate_craft": (0, 100), "rate_art": (0, 100),
+    # 施設の定数
+    "atelier_rooms": (0, None), "gacha_price": (0, None), "gacha_days": (0, 366),
+    "gacha_cost_rate": (0, 100), "volunteer_cost": (0, None),
+})
+
+# --- 固定の定数 ---
+MONTHS = 12              # 月額 → 年額
+
+# --- カテゴリ (df_detail の行と同じ並び) ---
+CATEGORIES = ["base", "asobi", "facility", "shop", "camp", "ex", "custom"]
+CATEGORY_LABELS = {
+    "base": "基礎数値(指定管理・雑)",
+    "asobi": "あそびっグラボ",
+    "facility": "施設利用(アトリエ等)",
+    "shop": "常設・ショップ",
+    "camp": "宿泊・体験",
+    "ex": "企画展",
+    "custom": "カスタムイベント",
+}
+CATEGORY_MEMO_KEYS = {
+    "asobi": "memo_asobi", "facility": "memo_facility", "shop": "memo_shop",
+    "camp": "memo_camp", "ex": "memo_ex",
+}
+TOTAL_LABEL = "★ 合計"
+DETAIL_COLUMNS = ["項目", "収入", "支出", "収支差益", "備考"]
+
+# compute() / evaluate() が返す列
+RESULT_KEYS = [f"{c}_{s}" for c in CATEGORIES for s in ("inc", "exp")] + \
+              ["atelier_inc", "ground_inc", "total_revenue", "total_expense", "profit"]
+
+# 計算式の版。compute() の式を変えたら1つ上げる (保存済みの計算結果のキャッシュを使わなくなる)
+FORMULA_VERSION = 1
+
+
+def event_totals(events):
+    """カスタムイベントのリストから、カテゴリ別の収入・支出合計を EVENT_KEYS の dict で返す"""
+    totals = dict.fromkeys(EVENT_KEYS, 0)
+    for ev in events:
+        category = ev.get("category") if ev.get("category") in EVENT_CATEGORIES else "custom"
+        totals[event_key(category, "inc")] += ev.get("inc", 0)
+        totals[event_key(category, "exp")] += ev.get("exp", 0)
+    return totals
+
+
+def compute(p):
+    """パラメータ p から各カテゴリの収入・支出を計算する。
+
+    p は dict / pandas.Series / DataFrame など INPUT_KEYS で引けるもの。
+    値がスカラーなら1プラン分、配列ならシナリオ数分をまとめて計算する。
+    """
+    # 基礎収支
+    base_inc = p["inc_manage"] + p["inc_misc"]
+    base_exp = (p["exp_wages"] + p["exp_utility"] + p["exp_maint"] +
+                p["exp_ops_base"] + p["exp_insurance"])
+
+    # あそびっグラボ
+    asobi_inc = (p["asobi_price_daily"] * p["asobi_daily_users"]) + \
+                (p["asobi_price_annual"] * p["asobi_annual_users"])
+    asobi_exp = p["asobi_mat_cost"]
+    asobi_inc = asobi_inc + p["event_asobi_inc"]
+    asobi_exp = asobi_exp + p["event_asobi_exp"]
+
+    # 施設利用
+    atelier_inc = p["atelier_rooms"] * p["atelier_price"] * MONTHS * (p["atelier_rate"] / 100)
+    ground_inc = p["ground_price"] * p["ground_count"]
+    facility_inc = atelier_inc + ground_inc + p["event_facility_inc"]
+    facility_exp = p["event_facility_exp"]  # イベント分のみ
+
+    # ショップ
+    gacha_sales = p["gacha_price"] * p["gacha_units"] * p["gacha_per_day"] * p["gacha_days"]
+    ws_sales = p["ws_users"] * p["ws_price"]
+    shop_inc = (p["sales_agri"] * MONTHS) + (p["sales_craft"] * MONTHS) + (p["sales_art"] * MONTHS) + \
+               gacha_sales + ws_sales
+    shop_exp = (p["sales_agri"] * MONTHS * (1 - p["rate_agri"] / 100)) + \
+               (p["sales_craft"] * MONTHS * (1 - p["rate_craft"] / 100)) + \
+               (p["sales_art"] * MONTHS * (1 - p["rate_art"] / 100)) + \
+               (gacha_sales * (p["gacha_cost_rate"] / 100)) + \
+               (ws_sales * (p["ws_mat_rate"] / 100))
+    shop_inc = shop_inc + p["event_shop_inc"]
+    shop_exp = shop_exp + p["event_shop_exp"]
+
+    # 宿泊・体験
+    camp_inc = (p["camp_groups"] * p["camp_price"]) + p["camp_option"]
+    camp_exp = (p["camp_groups"] * p["night_staff_cost"]) + p["camp_maint_cost"]
+    camp_inc = camp_inc + p["event_camp_inc"]
+    camp_exp = camp_exp + p["event_camp_exp"]
+
+    # 企画展
+    ex_inc = p["ex_visitors"] * p["ex_fee"]
+    ex_exp = p["ex_rental_cost"] + p["ex_mat_cost"] + p["ex_ad_cost"] + (p["ex_vol_count"] * p["volunteer_cost"])
+    ex_inc = ex_inc + p["event_ex_inc"]
+    ex_exp = ex_exp + p["event_ex_exp"]
+
+    # カスタムイベント (カテゴリ未指定のもの)
+    custom_inc = p["custom_inc"]
+    custom_exp = p["custom_exp"]
+
+    total_revenue = base_inc + asobi_inc + facility_inc + shop_inc + camp_inc + ex_inc + custom_inc
+    total_expense = base_exp + asobi_exp + facility_exp + shop_exp + camp_exp + ex_exp + custom_exp
+
+    return {
+        "base_inc": base_inc, "base_exp": base_exp,
+        "asobi_inc": asobi_inc, "asobi_exp": asobi_exp,
+        "facility_inc": facility_inc, "facility_exp": facility_exp,
+        "shop_inc": shop_inc, "shop_exp": shop_exp,
+        "camp_inc": camp_inc, "camp_exp": camp_exp,
+        "ex_inc": ex_inc, "ex_exp": ex_exp,
+        "custom_inc": custom_inc, "custom_exp": custom_exp,
+        "atelier_inc": atelier_inc, "ground_inc": ground_inc,
+        "total_revenue": total_revenue, "total_expense": total_expense,
+        "profit": total_revenue - total_expense,
+    }
+
+
+def to_frame(configs):
+    """設定(dict)のリストを、1行1シナリオの数値 DataFrame に変換する。
+
+    足りないキーは default_values で補い、custom_events は
+    カテゴリ別の合計列 (EVENT_KEYS) にまとめる。
+    """
+    rows = []
+    for cfg in configs:
+        row = {k: cfg.get(k, default_values[k]) for k in NUMERIC_KEYS}
+        row.update(event_totals(cfg.get("custom_events", [])))
+        rows.append(row)
+    return pd.DataFrame(rows, columns=INPUT_KEYS, dtype=float)
+
+
+def evaluate(frame):
+    """シナリオ DataFrame (INPUT_KEYS の列) を一括計算し、結果 DataFrame を返す"""
+    cols = {}
+    for k in INPUT_KEYS:
+        if k in frame:
+            cols[k] = np.asarray(frame[k], dtype=float)
+        elif k in EVENT_KEYS:
+            cols[k] = np.zeros(len(frame))
+        else:
+            cols[k] = np.full(len(frame), float(default_values[k]))
+    result = compute(cols)
+    return pd.DataFrame(result, columns=RESULT_KEYS, index=frame.index)
+
+
+def detail_frame(result, memos=None, events_memo="なし"):
+    """1シナリオ分の計算結果から df_detail と同じ明細表を作る"""
+    return pd.DataFrame(detail_rows(result, memos, events_memo), columns=DETAIL_COLUMNS)
+
+
+def detail_rows(result, memos=None, events_memo="なし"):
+    """detail_frame の行 (DETAIL_COLUMNS の並びのリスト) を返す"""
+    memos = memos or {}
+    rows = []
+    for c in CATEGORIES:
+        inc, exp = result[f"{c}_inc"], result[f"{c}_exp"]
+        if c == "base":
+            memo = "-"
+        elif c == "custom":
+            memo = events_memo
+        else:
+            memo = memos.get(CATEGORY_MEMO_KEYS[c], "")
+        rows.append([CATEGORY_LABELS[c], inc, exp, inc - exp, memo])
+    rows.append([TOTAL_LABEL, result["total_revenue"], result["total_expense"], result["profit"], ""])
+    return rows
+
+
+def category_frame(results):
+    """evaluate() の結果を (シナリオ, 項目) ごとの縦持ち明細に変換する"""
+    parts = []
+    for c in CATEGORIES:
+        parts.append(pd.DataFrame({
+            "scenario": results.index,
+            "項目": CATEGORY_LABELS[c],
+            "収入": results[f"{c}_inc"].to_numpy(),
+            "支出": results[f"{c}_exp"].to_numpy(),
+        }))
+    parts.append(pd.DataFrame({
+        "scenario": results.index,
+        "項目": TOTAL_LABEL,
+        "収入": results["total_revenue"].to_numpy(),
+        "支出": results["total_expense"].to_numpy(),
+    }))
+    long = pd.concat(parts, ignore_index=True)
+    long["収支差益"] = long["収入"] - long["支出"]
+    order = {label: i for i, label in enumerate(list(CATEGORY_LABELS.values()) + [TOTAL_LABEL])}
+    long["_order"] = long["項目"].map(order)
+    long = long.sort_values(["scenario", "_order"], kind="stable").drop(columns="_order")
+    return long.reset_index(drop=True)
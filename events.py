@@ -0,0 +1,225 @@
+import io
+
+import pandas as pd
+
+import engine
+
+# ==========================================
+# カスタムイベントの列指向ストア
+# ==========================================
+# イベントを1つの DataFrame (index = 変わらない連番ID) で持ち、
+# 追加・編集・削除のたびにカテゴリ別の合計 (engine.EVENT_KEYS) を差分で更新する。
+# 保存ファイルの custom_events (dict のリスト) とは to_records / from_records で相互変換する。
+
+COLUMNS = ["name", "inc", "exp", "memo", "category", "month"]
+COLUMN_LABELS = {
+    "name": "イベント名", "inc": "収入", "exp": "支出", "memo": "メモ・備考",
+    "category": "カテゴリ", "month": "月",
+}
+# 取り込みファイルの見出し (日本語・英語どちらでも可)
+IMPORT_ALIASES = {**{v: k for k, v in COLUMN_LABELS.items()}, **{k: k for k in COLUMNS}}
+
+# カテゴリ未指定は custom (カスタムイベント) として集計する
+CATEGORY_OPTIONS = {c: engine.CATEGORY_LABELS[c] for c in engine.EVENT_CATEGORIES}
+CATEGORY_BY_LABEL = {v: k for k, v in CATEGORY_OPTIONS.items()}
+
+PAGE_SIZE = 50
+
+
+def _category(value):
+    """カテゴリの表記ゆれ (キー / 表示名 / 空欄) を EVENT_CATEGORIES のキーにそろえる"""
+    if value in CATEGORY_OPTIONS:
+        return value
+    return CATEGORY_BY_LABEL.get(value, "custom")
+
+
+class EventStore:
+    """カスタムイベントの一覧と、カテゴリ別の収支合計を保持する"""
+
+    def __init__(self):
+        self.frame = pd.DataFrame({
+            "name": pd.Series(dtype="object"), "inc": pd.Series(dtype="float"),
+            "exp": pd.Series(dtype="float"), "memo": pd.Series(dtype="object"),
+            "category": pd.Series(dtype="object"), "month": pd.Series(dtype="Int64"),
+        })
+        self.frame.index.name = "id"
+        self.next_id = 0
+        self.totals = dict.fromkeys(engine.EVENT_KEYS, 0.0)
+
+    def __len__(self):
+        return len(self.frame)
+
+    # --- 合計の差分更新 ---
+    def _accumulate(self, rows, sign):
+        for (category, side), value in _sums(rows).items():
+            self.totals[engine.event_key(category, side)] += sign * value
+
+    # --- 追加・編集・削除 ---
+    def add_many(self, rows):
+        """イベントをまとめて追加し、振ったIDのリストを返す"""
+        rows = _clean(pd.DataFrame(rows))
+        ids = list(range(self.next_id, self.next_id + len(rows)))
+        rows.index = pd.Index(ids, name="id")
+        self.next_id += len(rows)
+        self.frame = rows if self.frame.empty else pd.concat([self.frame, rows])
+        self._accumulate(rows, 1)
+        return ids
+
+    def add(self, name, inc=0, exp=0, memo="", category="custom", month=None):
+        return self.add_many([{"name": name, "inc": inc, "exp": exp, "memo": memo,
+                               "category": category, "month": month}])[0]
+
+    def update(self, event_id, **fields):
+        old = self.frame.loc[[event_id]]
+        new = old.copy()
+        for k, v in fields.items():
+            new.at[event_id, k] = v
+        new = _clean(new)
+        self._accumulate(old, -1)
+        self._accumulate(new, 1)
+        self.frame.loc[event_id] = new.loc[event_id]
+
+    def delete(self, event_ids):
+        event_ids = [i for i in event_ids if i in self.frame.index]
+        self._accumulate(self.frame.loc[event_ids], -1)
+        self.frame = self.frame.drop(index=event_ids)
+
+    def apply_editor_changes(self, page_ids, changes):
+        """st.data_editor の変更内容 (edited_rows / added_rows / deleted_rows) を反映する。
+
+        page_ids は編集前に表示していた行のID (表示順)。
+        """
+        for pos, fields in changes.get("edited_rows", {}).items():
+            self.update(page_ids[int(pos)], **fields)
+        added = [r for r in changes.get("added_rows", []) if r.get("name")]
+        if added:
+            self.add_many(added)
+        deleted = [page_ids[int(pos)] for pos in changes.get("deleted_rows", [])]
+        if deleted:
+            self.delete(deleted)
+
+    # --- 参照 ---
+    @property
+    def income(self):
+        return sum(v for k, v in self.totals.items() if k.endswith("_inc"))
+
+    @property
+    def expense(self):
+        return sum(v for k, v in self.totals.items() if k.endswith("_exp"))
+
+    def page(self, number, size=PAGE_SIZE):
+        """number ページ目 (0始まり) の行を返す"""
+        return self.frame.iloc[number * size:(number + 1) * size]
+
+    def n_pages(self, size=PAGE_SIZE):
+        return max(1, -(-len(self.frame) // size))
+
+    def by_category(self):
+        frame = self.frame.assign(category=self.frame["category"].map(CATEGORY_OPTIONS))
+        return frame.groupby("category")[["inc", "exp"]].sum()
+
+    def by_month(self):
+        return self.frame.dropna(subset=["month"]).groupby("month")[["inc", "exp"]].sum()
+
+    def memo_summary(self, limit=10):
+        """明細表の備考欄用に、イベント名(メモ)を先頭 limit 件だけ並べる"""
+        head = self.frame.head(limit)
+        return _memo_text(zip(head["name"], head["memo"]), len(self.frame), limit)
+
+    # --- 保存形式との変換 ---
+    def to_records(self):
+        """保存用の custom_events (dict のリスト) に変換する"""
+        records = []
+        for row in self.frame.itertuples(index=False):
+            rec = {"name": row.name, "inc": _number(row.inc), "exp": _number(row.exp), "memo": row.memo}
+            if row.category != "custom":
+                rec["category"] = row.category
+            if not pd.isna(row.month):
+                rec["month"] = int(row.month)
+            records.append(rec)
+        return records
+
+    @classmethod
+    def from_records(cls, records):
+        store = cls()
+        if records:
+            store.add_many(records)
+        return store
+
+
+def memo_summary(records, limit=10):
+    """EventStore.memo_summary と同じ備考欄の文字列を、保存形式の custom_events から作る"""
+    return _memo_text(((r.get("name", ""), r.get("memo", "")) for r in records[:limit]), len(records), limit)
+
+
+def _memo_text(names_memos, total, limit):
+    if not total:
+        return "なし"
+    names = [f"{n}({m})" if m else f"{n}" for n, m in names_memos]
+    if total > limit:
+        names.append(f"他{total - limit}件")
+    return "、".join(names)
+
+
+def _number(x):
+    return int(x) if float(x).is_integer() else float(x)
+
+
+def _clean(rows):
+    """列をそろえ、型を正規化する"""
+    rows = rows.reindex(columns=COLUMNS)
+    rows["name"] = rows["name"].fillna("").astype(str)
+    rows["inc"] = pd.to_numeric(rows["inc"], errors="coerce").fillna(0.0).astype(float)
+    rows["exp"] = pd.to_numeric(rows["exp"], errors="coerce").fillna(0.0).astype(float)
+    rows["memo"] = rows["memo"].fillna("").astype(str)
+    rows["category"] = rows["category"].map(_category).astype(object)
+    month = pd.to_numeric(rows["month"], errors="coerce")
+    rows["month"] = month.where(month.between(1, 12)).round().astype("Int64")
+    return rows
+
+
+def _sums(rows):
+    """{(カテゴリ, "inc"/"exp"): 合計} を返す"""
+    sums = {}
+    if rows.empty:
+        return sums
+    grouped = rows.groupby("category")[["inc", "exp"]].sum()
+    for category, r in grouped.iterrows():
+        sums[(category, "inc")] = float(r["inc"])
+        sums[(category, "exp")] = float(r["exp"])
+    return sums
+
+
+def read_table(name, raw):
+    """CSV / Excel のバイト列からイベント一覧を読み込み、(DataFrame, エラー一覧) を返す"""
+    try:
+        if name.lower().endswith((".xlsx", ".xls")):
+            table = pd.read_excel(io.BytesIO(raw))
+        else:
+            table = pd.read_csv(io.BytesIO(raw), encoding="utf-8-sig")
+    except Exception as e:
+        return None, [f"{name}: 読み込めません ({e})"]
+
+    table = table.rename(columns=lambda c: IMPORT_ALIASES.get(str(c).strip(), c))
+    if "name" not in table:
+        return None, [f"{name}: 「イベント名」(name) の列がありません"]
+
+    # 行ごとにエラーを集め、エラーのある行は取り込まない
+    problems = []
+    for col in ("inc", "exp"):
+        if col in table:
+            bad = table[col].notna() & pd.to_numeric(table[col], errors="coerce").isna()
+            problems.append((bad, f"{COLUMN_LABELS[col]}が数値ではありません"))
+    if "month" in table:
+        month = pd.to_numeric(table["month"], errors="coerce")
+        problems.append((table["month"].notna() & ~month.between(1, 12), "月は1〜12で指定してください"))
+    problems.append((table["name"].isna() | (table["name"].astype(str).str.strip() == ""), "イベント名が空です"))
+
+    valid = pd.Series(True, index=table.index)
+    errors = []
+    for pos, idx in enumerate(table.index):
+        for bad, message in problems:
+            if bad[idx]:
+                errors.append(f"{name} {pos + 2}行目: {message}")  # 見出しが1行目
+                valid[idx] = False
+    return table[valid], errors
@@ -0,0 +1,122 @@
+import math
+
+import numpy as np
+
+import engine
+
+# ==========================================
+# ゴールシーク (損益分岐点ソルバー)
+# ==========================================
+# 「profit ≧ 目標 となる X の最小値/最大値」を求める。
+# engine の計算式はどの入力についても1変数で見れば1次式なので、
+# 2点で評価すれば傾きと切片が決まり、解析的に解ける。
+# 1次式でない指標 (将来の拡張など) は二分法で解く。
+
+# 制約に使える指標 (engine の結果キー + カテゴリ別の収支差益)
+METRICS = ["profit", "total_revenue", "total_expense"] + [f"{c}_profit" for c in engine.CATEGORIES]
+METRIC_LABELS = {
+    "profit": "最終収支", "total_revenue": "総収入", "total_expense": "総支出",
+    **{f"{c}_profit": f"{engine.CATEGORY_LABELS[c]} 収支差益" for c in engine.CATEGORIES},
+}
+
+# 上限なしの入力を探索するときの上限
+SEARCH_LIMIT = 1e10
+
+
+def metric(result, name):
+    """計算結果から指標を取り出す (カテゴリ別の収支差益にも対応)"""
+    if name.endswith("_profit") and name != "profit":
+        c = name[:-len("_profit")]
+        return result[f"{c}_inc"] - result[f"{c}_exp"]
+    return result[name]
+
+
+def _evaluate(base, key, values):
+    """key だけを values に置き換えて計算する (結果はすべて values と同じ長さの配列)"""
+    params = {k: float(base[k]) for k in engine.INPUT_KEYS}
+    params[key] = np.asarray(values, dtype=float)
+    return {k: np.broadcast_to(v, params[key].shape) for k, v in engine.compute(params).items()}
+
+
+def _bounds(key, bounds=None):
+    lo, hi = bounds or engine.PARAM_BOUNDS.get(key, (0, None))
+    return float(lo), float(SEARCH_LIMIT if hi is None else hi)
+
+
+def _bisect(f, lo, hi, tol=1e-6, max_iter=200):
+    """f(lo) と f(hi) の符号が異なる区間で f(x)=0 を二分法で解く"""
+    f_lo = f(lo)
+    for _ in range(max_iter):
+        mid = (lo + hi) / 2
+        f_mid = f(mid)
+        if (f_mid < 0) == (f_lo < 0):
+            lo, f_lo = mid, f_mid
+        else:
+            hi = mid
+        if hi - lo <= tol * max(1.0, abs(mid)):
+            break
+    return (lo + hi) / 2
+
+
+def feasible_interval(base, key, constraints, bounds=None):
+    """全制約を満たす key の区間 (lo, hi) を返す。満たせなければ None。
+
+    constraints は (指標名, ">=" または "<=", 目標値) のリスト。
+    """
+    lo, hi = _bounds(key, bounds)
+    mid = (lo + hi) / 2
+    for name, op, target in constraints:
+        y_lo, y_mid, y_hi = metric(_evaluate(base, key, [lo, mid, hi]), name)
+        sign = 1 if op == ">=" else -1
+        g_lo, g_mid, g_hi = sign * (y_lo - target), sign * (y_mid - target), sign * (y_hi - target)
+        linear = math.isclose(y_mid, (y_lo + y_hi) / 2, rel_tol=1e-9, abs_tol=1e-6)
+
+        if g_lo >= 0 and g_hi >= 0 and (linear or g_mid >= 0):
+            continue  # 区間全体で満たす
+        if g_lo < 0 and g_hi < 0 and (linear or g_mid < 0):
+            return None  # どこでも満たせない
+
+        if linear:
+            slope = (y_hi - y_lo) / (hi - lo)
+            root = lo + (target - y_lo) / slope
+        else:
+            g = lambda x: sign * (float(metric(_evaluate(base, key, [x]), name)[0]) - target)
+            root = _bisect(g, lo, hi)
+        # 根のどちら側で満たすか
+        if g_hi >= 0:
+            lo = max(lo, root)
+        else:
+            hi = min(hi, root)
+        if lo > hi:
+            return None
+        mid = (lo + hi) / 2
+    return lo, hi
+
+
+def solve(base, key, constraints, direction="min", bounds=None, integer=True):
+    """全制約を満たす key の最小値(direction="min")または最大値("max")を求める。
+
+    戻り値は dict: value (解。満たせなければ None), interval (満たす区間),
+    result (解での計算結果), feasible, unbounded (上限なしで最大値が決まらない)。
+    """
+    interval = feasible_interval(base, key, constraints, bounds)
+    if interval is None:
+        return {"key": key, "value": None, "interval": None, "result": None, "feasible": False,
+                "unbounded": False}
+
+    lo, hi = interval
+    value = lo if direction == "min" else hi
+    # 上限なしの入力で最大値を求めた場合は探索上限に張り付く
+    unbounded = value >= SEARCH_LIMIT
+    if integer:
+        rounded = math.ceil(value - 1e-9) if direction == "min" else math.floor(value + 1e-9)
+        # 丸めで区間から外れた場合は範囲内に戻す
+        value = rounded if lo - 1e-9 <= rounded <= hi + 1e-9 else value
+    result = {k: float(v[0]) for k, v in _evaluate(base, key, [value]).items()}
+    return {"key": key, "value": value, "interval": interval, "result": result, "feasible": True,
+            "unbounded": unbounded}
+
+
+def break_even(base, key, target=0, direction="min", bounds=None):
+    """profit ≧ target となる key の最小値(または最大値)を返す。満たせなければ None。"""
+    return solve(base, key, [("profit", ">=", target)], direction, bounds)["value"]
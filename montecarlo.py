@@ -0,0 +1,161 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+import engine
+
+# ==========================================
+# モンテカルロ・リスクシミュレーション
+# ==========================================
+# 各ドライバーに分布を与えて大量に抽選し、最終収支(profit)の分布を求める。
+# 抽選はチャンク単位で行い、チャンクごとに SeedSequence から乱数を派生させるため、
+# 同じ seed なら逐次実行でもプロセスプールでも同じ結果になる。
+
+# 分布を与えられるドライバー (画面の並び順)
+DRIVERS = {
+    "asobi_daily_users": "あそびっグラボ 年間利用者数",
+    "atelier_rate": "アトリエ入居率(%)",
+    "camp_groups": "宿泊 利用組数/年",
+    "ex_visitors": "企画展 有料入場者数",
+    "gacha_per_day": "ガチャ回転/日",
+    "sales_agri": "農産物 売上(月)",
+    "sales_craft": "工芸品 売上(月)",
+    "sales_art": "美術品 売上(月)",
+}
+
+# 分布の種類と、そのパラメータ名
+DISTRIBUTIONS = {
+    "normal": ("mean", "sd"),
+    "uniform": ("low", "high"),
+    "triangular": ("low", "mode", "high"),
+}
+
+# 値の上限 (下限はすべて0)
+UPPER_BOUNDS = {"atelier_rate": 100}
+
+DEFAULT_CHUNK_SIZE = 100_000
+PERCENTILES = (5, 50, 95)
+
+
+def default_spec(params, drivers=None, spread=0.2):
+    """現在値 ±spread の三角分布を各ドライバーに割り当てた初期設定を返す"""
+    spec = {}
+    for k in drivers or DRIVERS:
+        v = float(params[k])
+        high = v * (1 + spread)
+        if k in UPPER_BOUNDS:
+            high = min(high, UPPER_BOUNDS[k])
+        spec[k] = ("triangular", {"low": v * (1 - spread), "mode": v, "high": high})
+    return spec
+
+
+def check_spec(spec):
+    """spec の誤り (未対応の分布・数値でないパラメータ・負の標準偏差など) をすべて集めて返す"""
+    errors = []
+    for k, (dist, p) in spec.items():
+        label = DRIVERS.get(k, k)
+        if dist not in DISTRIBUTIONS:
+            errors.append(f"{label}: 未対応の分布です ({dist})")
+            continue
+        values = {name: p.get(name) for name in DISTRIBUTIONS[dist]}
+        bad = [name for name, v in values.items() if not isinstance(v, (int, float)) or not np.isfinite(v)]
+        if bad:
+            errors.append(f"{label}: {'・'.join(bad)} が数値ではありません")
+            continue
+        if dist == "normal" and values["sd"] < 0:
+            errors.append(f"{label}: sd は0以上で指定してください ({values['sd']})")
+        elif dist == "uniform" and values["low"] > values["high"]:
+            errors.append(f"{label}: low は high 以下で指定してください ({values['low']} > {values['high']})")
+    return errors
+
+
+def draw(spec, n, rng):
+    """spec に従って各ドライバーを n 件抽選する (spec に誤りがあれば ValueError)"""
+    errors = check_spec(spec)
+    if errors:
+        raise ValueError("\n".join(errors))
+    samples = {}
+    for k, (dist, p) in spec.items():
+        if dist == "normal":
+            x = rng.normal(p["mean"], p["sd"], n)
+        elif dist == "uniform":
+            x = rng.uniform(p["low"], p["high"], n)
+        else:
+            low, mode, high = p["low"], p["mode"], p["high"]
+            if high <= low:
+                x = np.full(n, float(mode))
+            else:
+                x = rng.triangular(low, min(max(mode, low), high), high, n)
+        np.clip(x, 0, UPPER_BOUNDS.get(k, np.inf), out=x)
+        samples[k] = x
+    return samples
+
+
+def _run_chunk(base, spec, n, seed_seq):
+    """1チャンク分を抽選・計算し、profit と各カテゴリ収支の合計を返す"""
+    rng = np.random.default_rng(seed_seq)
+    params = dict(base)
+    params.update(draw(spec, n, rng))
+    result = engine.compute(params)
+    sums = {k: float(np.sum(np.broadcast_to(result[k], (n,)))) for k in engine.RESULT_KEYS}
+    return np.asarray(result["profit"], dtype=float), sums
+
+
+def _chunk_sizes(n_draws, chunk_size):
+    full, rest = divmod(n_draws, chunk_size)
+    return [chunk_size] * full + ([rest] if rest else [])
+
+
+def run(base, spec, n_draws, seed=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """モンテカルロ・シミュレーションを実行し、集計結果を dict で返す。
+
+    base は engine.INPUT_KEYS を持つ現在のパラメータ、spec は
+    {キー: (分布名, パラメータdict)}。workers を指定するとプロセスプールで並列実行する。
+    保持するのは profit 配列とカテゴリ別の合計だけなので、
+    中間配列のメモリはチャンクサイズ分で頭打ちになる。
+    spec に誤りがあれば抽選を始める前に ValueError を送出する。
+    """
+    errors = check_spec(spec)
+    if errors:
+        raise ValueError("\n".join(errors))
+    base = {k: float(base[k]) for k in engine.INPUT_KEYS}
+    sizes = _chunk_sizes(int(n_draws), int(chunk_size))
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    profit = np.empty(sum(sizes))
+    totals = dict.fromkeys(engine.RESULT_KEYS, 0.0)
+
+    if workers and workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = pool.map(_run_chunk, [base] * len(sizes), [spec] * len(sizes), sizes, seeds)
+            _collect(chunks, profit, totals)
+    else:
+        chunks = (_run_chunk(base, spec, n, s) for n, s in zip(sizes, seeds))
+        _collect(chunks, profit, totals)
+
+    return summarize(profit, totals)
+
+
+def _collect(chunks, profit, totals):
+    pos = 0
+    for chunk_profit, sums in chunks:
+        profit[pos:pos + len(chunk_profit)] = chunk_profit
+        pos += len(chunk_profit)
+        for k, v in sums.items():
+            totals[k] += v
+
+
+def summarize(profit, totals=None):
+    """profit の配列から P5/P50/P95・赤字確率などをまとめる"""
+    n = len(profit)
+    p5, p50, p95 = np.percentile(profit, PERCENTILES)
+    summary = {
+        "n": n,
+        "profit": profit,
+        "mean": float(profit.mean()),
+        "std": float(profit.std()),
+        "p5": float(p5), "p50": float(p50), "p95": float(p95),
+        "deficit_prob": float(np.count_nonzero(profit < 0) / n),
+    }
+    if totals is not None:
+        summary["category_mean"] = {k: v / n for k, v in totals.items()}
+    return summary
@@ -1,8 +1,30 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import json
 import datetime
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import engine
+import montecarlo
+import optimize
+import sweep
+import projection
+import goalseek
+import compare
+import perf
+import events
+import portfolio
+import report
+import schema
+import store
+
+# 区間ごとの処理時間を計測する (サイドバーのデバッグ表示・書き出し用)
+timer = perf.Timer()
+from engine import default_values
 
 # --- ページ設定 ---
 st.set_page_config(page_title="BIGLABO 運営シミュレーター(修正完了版v2)", layout="wide")
@@ -15,63 +37,276 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- デフォルト値の定義 ---
-default_values = {
-    "creator_name": "担当者",
-    # 基礎収支
-    "inc_manage": 10000000, "inc_misc": 100000,
-    "exp_wages": 5200000, "exp_utility": 1300000, "exp_maint": 1100000,
-    "exp_ops_base": 1440000, "exp_insurance": 100000,
-    # 施設利用
-    "atelier_price": 10000, "atelier_rate": 80, 
-    "ground_price": 300, "ground_count": 100,
-    "memo_facility": "（例）アトリエは満室稼働を目指す。",
-    # あそびっグラボ
-    "asobi_price_daily": 300, "asobi_price_annual": 3000,
-    "asobi_daily_users": 500, "asobi_annual_users": 50, "asobi_mat_cost": 50000,
-    "memo_asobi": "（例）土日祝のみ開館想定。",
-    # ショップ
-    "sales_agri": 50000, "rate_agri": 10,
-    "sales_craft": 100000, "rate_craft": 20,
-    "sales_art": 50000, "rate_art": 30,
-    "gacha_units": 2, "gacha_per_day": 3,
-    "ws_users": 500, "ws_price": 500, "ws_mat_rate": 30,
-    "memo_shop": "（例）農産物は地元農家5軒と契約予定。",
-    # 宿泊
-    "camp_groups": 50, "camp_price": 15000, "camp_option": 100000,
-    "night_staff_cost": 5000, "camp_maint_cost": 50000,
-    "memo_camp": "（例）繁忙期は8月と10月を想定。",
-    # 企画展
-    "ex_visitors": 1000, "ex_fee": 500,
-    "ex_rental_cost": 50000, "ex_mat_cost": 30000,
-    "ex_ad_cost": 50000, "ex_vol_count": 5,
-    "memo_ex": "（例）春は「猫展」、秋は「恐竜展」を実施。",
-    # イベントリスト
-    "custom_events": [] 
-}
-
 # --- 初期化処理 ---
 for key, val in default_values.items():
     if key not in st.session_state:
         st.session_state[key] = val
 
+# カスタムイベントは列指向のストアで持つ (読込直後などリストのときは変換する)
+if not isinstance(st.session_state.custom_events, events.EventStore):
+    st.session_state.custom_events = events.EventStore.from_records(st.session_state.custom_events)
+if "portfolio" not in st.session_state:
+    st.session_state.portfolio = portfolio.Portfolio()
+if "ev_editor_version" not in st.session_state:
+    st.session_state.ev_editor_version = 0
+
+def current_config():
+    """現在の設定を保存ファイルと同じ形 (custom_events はリスト、版付き) で返す"""
+    config = {k: st.session_state[k] for k in default_values.keys()}
+    config["custom_events"] = st.session_state.custom_events.to_records()
+    return schema.tag(config)
+
+def apply_config(config):
+    """検証済みの設定を画面の入力値に反映する (ファイルにない項目はデフォルト値に戻る)"""
+    for k in default_values:
+        st.session_state[k] = config[k]
+    st.session_state.ev_editor_version += 1
+
 # --- 読み込み処理を行うコールバック関数 ---
 def load_json_file():
     """ファイルアップローダーが変更されたときに呼ばれる関数"""
     uploaded = st.session_state.upload_json # アップローダーのkeyからファイル取得
     if uploaded is not None:
-        try:
-            data = json.load(uploaded)
-            for k, v in data.items():
-                # default_valuesにあるキーで、かつ整数であるべきものはint変換
-                if k in default_values:
-                    if isinstance(default_values[k], int) and isinstance(v, (float, int)):
-                         st.session_state[k] = int(v)
-                    else:
-                         st.session_state[k] = v
-            st.toast("設定を読み込みました！", icon="✅")
-        except Exception as e:
-            st.error(f"読み込みエラー: {e}")
+        [(_, data, errors)] = compare.read_files([(uploaded.name, uploaded.getvalue())])
+        warnings = []
+        if data is not None:
+            # 型・範囲を検証し、古い版のファイルは現在の形に移行する
+            config, errors, warnings = schema.validate(data)
+        for w in warnings:
+            st.warning(f"{uploaded.name}: {w}")
+        if errors:
+            # 誤りがあれば一部だけ反映することはせず、全部のエラーを表示する
+            st.error(f"読み込みエラー ({uploaded.name}):\n\n" + "\n".join(f"- {e}" for e in errors))
+            return
+        apply_config(config)
+        st.toast("設定を読み込みました！", icon="✅")
+
+def apply_event_edits(page_ids):
+    """イベント一覧の編集内容をストアに反映するコールバック関数"""
+    editor_key = f"ev_editor_{st.session_state.ev_editor_version}"
+    st.session_state.custom_events.apply_editor_changes(page_ids, st.session_state[editor_key])
+    # 反映済みの変更が二重に適用されないよう、エディタを作り直す
+    st.session_state.ev_editor_version += 1
+
+def import_events():
+    """CSV / Excel のイベント一覧を一括で追加するコールバック関数"""
+    uploaded = st.session_state.ev_import
+    if uploaded is None:
+        return
+    table, errors = events.read_table(uploaded.name, uploaded.getvalue())
+    if table is not None and len(table):
+        st.session_state.custom_events.add_many(table)
+        st.session_state.ev_editor_version += 1
+        st.toast(f"{len(table)}件のイベントを追加しました！", icon="✅")
+    for err in errors[:20]:
+        st.warning(err)
+
+def import_facilities():
+    """施設の設定ファイルを読み込んでポートフォリオに追加するコールバック関数"""
+    files = st.session_state.pf_files or []
+    configs, errors, warnings = compare.load_configs([(f.name, f.getvalue()) for f in files])
+    for name, warns in warnings.items():
+        st.warning(f"{name}: " + " / ".join(warns))
+    if errors:
+        # 1件でも誤りがあれば、計算を始める前にまとめて取り込みを中止する
+        st.error(f"{len(errors)}件のファイルに誤りがあるため、取り込みを中止しました。\n\n" +
+                 "\n".join(f"- **{name}**: " + " / ".join(errs) for name, errs in errors.items()))
+        return
+    for name, config in configs.items():
+        st.session_state.portfolio.set(name, config)  # 追加した施設だけを計算する
+
+def apply_value(key, value):
+    """分析結果の値を入力欄に反映するコールバック関数"""
+    st.session_state[key] = int(value)
+
+def apply_values(values):
+    """複数の値 {キー: 値} をまとめて入力欄に反映するコールバック関数"""
+    for key, value in values.items():
+        st.session_state[key] = int(value)
+
+def follow_current(tag, current, keys):
+    """current (既定値の元にした現在値) が前回と変わっていたら keys の入力欄の値を消す。
+
+    キー付きの入力欄は最初の描画後 value= の変更を無視するので、
+    消して作り直させ、既定値を現在の計画に合わせ直す。
+    """
+    seen = st.session_state.setdefault("widget_bases", {})
+    if tag in seen and seen[tag] != current:
+        for key in keys:
+            st.session_state.pop(key, None)
+    seen[tag] = current
+
+# --- 描画のメモ化 (カテゴリ別の合計が同じなら図・表を作り直さない) ---
+# 図はセッション間で共有して読み取り専用で使うので cache_resource に置く
+@st.cache_resource(max_entries=256)
+def build_summary_charts(inc_values, exp_values):
+    df_inc_chart = pd.DataFrame({
+        "カテゴリ": ["基礎(指定管理+雑)", "あそびっグラボ", "施設利用(アトリエ等)", "常設・ショップ", "宿泊・体験", "企画展", "カスタムイベント"],
+        "金額": list(inc_values)
+    })
+    fig_inc = px.pie(df_inc_chart, values='金額', names='カテゴリ', title="収入内訳", hole=0.4)
+    fig_inc.update_layout(height=250, margin=dict(t=30, b=0, l=0, r=0))
+
+    df_exp_chart = pd.DataFrame({
+        "カテゴリ": ["基礎(人件費等)", "あそびグラボ費", "施設利用費", "ショップ原価", "宿泊費", "企画展費", "イベント費"],
+        "金額": list(exp_values)
+    })
+    fig_exp = px.pie(df_exp_chart, values='金額', names='カテゴリ', title="支出内訳", hole=0.4,
+                     color_discrete_sequence=px.colors.sequential.Reds_r)
+    fig_exp.update_layout(height=250, margin=dict(t=30, b=0, l=0, r=0))
+
+    df_balance = pd.DataFrame({
+        "種別": ["収入", "支出"],
+        "金額": [sum(inc_values), sum(exp_values)]
+    })
+    fig_bar = px.bar(df_balance, x="金額", y="種別", orientation='h', color="種別", title="全体収支バランス",
+                     color_discrete_map={"収入":"#1f77b4", "支出":"#C62828"}, text_auto=',.0f')
+    fig_bar.update_layout(height=250, margin=dict(t=30, b=0, l=0, r=0))
+    return fig_inc, fig_exp, fig_bar
+
+@st.cache_data(max_entries=256)
+def build_detail_frame(totals, memos, events_memo):
+    return engine.detail_frame(dict(totals), dict(memos), events_memo)
+
+# --- 共有シナリオ (SQLite) ---
+@st.cache_resource
+def get_scenario_store():
+    return store.ScenarioStore()
+
+# 一覧・履歴は再実行のたびに読まず、数秒だけ使い回す (自分の保存時はすぐ消す)
+SCENARIO_LIST_TTL = 10
+
+@st.cache_data(ttl=SCENARIO_LIST_TTL)
+def cached_scenario_list():
+    return get_scenario_store().list()
+
+@st.cache_data(ttl=SCENARIO_LIST_TTL)
+def cached_scenario_history(name):
+    return get_scenario_store().history(name)
+
+def save_to_store():
+    """現在の設定をサーバーに新しい版として保存するコールバック関数"""
+    name = st.session_state.db_save_name
+    if not name:
+        return
+    try:
+        version = get_scenario_store().save(name, current_config(), st.session_state.creator_name,
+                                            st.session_state.db_save_note)
+    except ValueError as e:  # 検証エラー (入力値が保存できる範囲外など)
+        st.error(f"保存できませんでした: {e}")
+        return
+    except sqlite3.Error as e:  # 他の人の保存と重なって待ちきれなかった場合など
+        st.error(f"サーバーへの保存に失敗しました。しばらくしてからもう一度保存してください ({e})")
+        return
+    cached_scenario_list.clear()
+    cached_scenario_history.clear(name)
+    st.toast(f"「{name}」を版{version}として保存しました！", icon="✅")
+
+def load_from_store():
+    """サーバーに保存されたシナリオを読み込むコールバック関数"""
+    name, version = st.session_state.db_pick, st.session_state.db_version
+    apply_config(get_scenario_store().load(name, version))
+    st.toast(f"「{name}」版{version}を読み込みました！", icon="✅")
+
+# --- 報告書 (Excel) の作成 ---
+# スクリプトのスレッドを止めないよう、別スレッドで作って一時ファイルに書き出す
+@st.cache_resource
+def get_report_executor():
+    return ThreadPoolExecutor(max_workers=2)
+
+def start_report(job_key, configs, file_name):
+    """報告書の作成をバックグラウンドで始めるコールバック関数"""
+    old = st.session_state.get(job_key)
+    if old is not None:
+        old.cancel()
+    st.session_state[job_key] = report.ReportJob(get_report_executor(), configs, file_name)
+
+def report_status(job_key):
+    """作成中は1秒ごとに進み具合を表示し、できあがったらダウンロードボタンを表示する"""
+    job = st.session_state.get(job_key)
+    if job is None:
+        return
+    polling = not job.finished
+
+    @st.fragment(run_every=1.0 if polling else None)
+    def status():
+        if not job.finished:
+            st.progress(job.done / max(job.total, 1), text=f"報告書を作成中… ({job.done}/{job.total}シナリオ)")
+        elif polling:
+            st.rerun()  # 作成が終わったら全体を描き直して定期実行を止める
+        else:
+            try:
+                data = job.read()
+            except Exception as e:
+                st.error(f"報告書を作成できませんでした: {e}")
+                return
+            st.download_button("📥 報告書をダウンロード", data, job.file_name, report.XLSX_MIME,
+                               key=f"{job_key}_download")
+    status()
+
+# --- キャッシュ付きの分析計算 (入力が同じなら再計算しない) ---
+@st.cache_data(max_entries=64)
+def cached_grid(base, x_key, x_values, y_key=None, y_values=None):
+    return sweep.grid_frame(base, x_key, list(x_values), y_key, list(y_values) if y_values else None)
+
+@st.cache_data(max_entries=64)
+def cached_tornado(base, pct):
+    return sweep.tornado(base, pct)
+
+@st.cache_data(max_entries=16)
+def cached_load_configs(files):
+    return compare.load_configs(files)
+
+# --- 分析タブの図 (入力が同じなら作り直さない。build_summary_charts と同じく読み取り専用で共有する) ---
+@st.cache_resource(max_entries=64)
+def build_sweep_chart(base, x_key, x_values, y_key=None, y_values=None):
+    label_of = lambda k: engine.PARAM_LABELS.get(k, k)
+    df_grid = cached_grid(base, x_key, x_values, y_key, y_values)
+    if y_key:
+        z = df_grid["profit"].to_numpy().reshape(len(x_values), len(y_values)).T
+        fig = px.imshow(z, x=list(x_values), y=list(y_values), origin="lower", aspect="auto",
+                        color_continuous_scale="RdBu", color_continuous_midpoint=0,
+                        labels={"x": label_of(x_key), "y": label_of(y_key), "color": "最終収支"},
+                        title="最終収支ヒートマップ")
+        fig.add_scatter(x=[base[x_key]], y=[base[y_key]], mode="markers", name="現在値",
+                        marker=dict(symbol="x", size=12, color="black"))
+    else:
+        fig = px.line(df_grid, x=x_key, y="profit", title="最終収支の推移",
+                      labels={x_key: label_of(x_key), "profit": "最終収支"})
+        fig.add_hline(y=0, line_color="#C62828")
+        fig.add_vline(x=base[x_key], line_dash="dash", annotation_text="現在値")
+    fig.update_layout(height=400, margin=dict(t=30, b=0, l=0, r=0))
+    return fig
+
+@st.cache_resource(max_entries=64)
+def build_tornado_chart(base, pct):
+    df_tornado = cached_tornado(base, pct).head(15)
+    df_plot = pd.concat([
+        pd.DataFrame({"項目": df_tornado["項目"], "変化": df_tornado["low_delta"], "方向": f"-{pct}%"}),
+        pd.DataFrame({"項目": df_tornado["項目"], "変化": df_tornado["high_delta"], "方向": f"+{pct}%"}),
+    ])
+    fig = px.bar(df_plot, x="変化", y="項目", color="方向", orientation="h", barmode="overlay",
+                 title=f"トルネード図 (±{pct}% の最終収支への影響)",
+                 color_discrete_map={f"-{pct}%": "#C62828", f"+{pct}%": "#1f77b4"})
+    fig.update_yaxes(categoryorder="array", categoryarray=list(df_tornado["項目"])[::-1])
+    fig.update_layout(height=450, margin=dict(t=30, b=0, l=0, r=0))
+    return fig
+
+@st.cache_resource(max_entries=16)
+def build_projection_chart(df_proj):
+    fig = px.line(df_proj, x="month", y="cash", title="累積資金残高の推移",
+                  labels={"month": "経過月", "cash": "資金残高(円)"})
+    fig.add_bar(x=df_proj["month"], y=df_proj["profit"], name="月次収支", marker_color="#90CAF9")
+    fig.update_layout(height=350, margin=dict(t=30, b=0, l=0, r=0))
+    return fig
+
+@st.cache_resource(max_entries=16)
+def build_compare_chart(cmp_results, cmp_base, cmp_value):
+    cmp_delta = compare.deltas(cmp_results, cmp_base, cmp_value).drop(index=engine.TOTAL_LABEL)
+    cmp_delta = cmp_delta.drop(columns=cmp_base).reset_index().melt(id_vars="項目", var_name="シナリオ", value_name="差額")
+    fig = px.bar(cmp_delta, x="シナリオ", y="差額", color="項目", title=f"「{cmp_base}」との差額 ({cmp_value})")
+    fig.update_layout(height=400, margin=dict(t=30, b=0, l=0, r=0))
+    return fig
 
 # ==========================================
 # サイドバー：ファイル操作
@@ -85,9 +320,14 @@ with st.sidebar:
     # 2. 保存ボタン
     today_str = datetime.date.today().strftime('%Y%m%d')
     file_name = f"{st.session_state.creator_name}{today_str}.json"
-    current_config = {k: st.session_state[k] for k in default_values.keys()}
-    json_str = json.dumps(current_config, ensure_ascii=False, indent=2)
+    json_str = json.dumps(current_config(), ensure_ascii=False, indent=2)
     st.download_button("設定を保存 (PCへ)", json_str, file_name, "application/json")
+
+    # 入力値・明細・グラフ・メモをまとめた提出用の Excel
+    st.button("📑 報告書を作成 (Excel)", on_click=start_report, key="report_start",
+              args=("report_job", {st.session_state.creator_name: current_config()},
+                    f"{st.session_state.creator_name}{today_str}_報告書.xlsx"))
+    report_status("report_job")
     
     st.markdown("---")
     
@@ -99,6 +339,24 @@ with st.sidebar:
         on_change=load_json_file # 変更時に上記関数を実行
     )
 
+    # 4. 共有シナリオ (サーバー保存・版管理)
+    st.markdown("---")
+    st.subheader("🗄️ 共有シナリオ")
+    st.text_input("シナリオ名", value=st.session_state.creator_name, key="db_save_name")
+    st.text_input("変更メモ (任意)", key="db_save_note")
+    st.button("サーバーに保存", on_click=save_to_store, key="db_save")
+
+    # 一覧はメタデータだけを読み、設定本体は読込時に取得する
+    db_list = cached_scenario_list()
+    if len(db_list):
+        db_pick = st.selectbox("保存済みシナリオ", list(db_list["name"]), key="db_pick")
+        db_history = cached_scenario_history(db_pick)
+        st.selectbox("版", list(db_history["version"]), key="db_version",
+                     format_func=lambda v: f"版{v} ({db_history.set_index('version').at[v, 'created_at']})")
+        st.button("サーバーから読込", on_click=load_from_store, key="db_load")
+        with st.expander("版の履歴"):
+            st.dataframe(db_history, hide_index=True, use_container_width=True)
+
 # ==========================================
 # 1. グラフ表示エリア (トップ固定)
 # ==========================================
@@ -126,15 +384,29 @@ st.sidebar.number_input("修繕・通信", step=10000, format="%d", key="exp_mai
 st.sidebar.number_input("事務運営費", step=10000, format="%d", key="exp_ops_base")
 st.sidebar.number_input("保険料", step=5000, format="%d", key="exp_insurance")
 
-base_income = st.session_state.inc_manage + st.session_state.inc_misc
-base_expense = (st.session_state.exp_wages + st.session_state.exp_utility + 
-                st.session_state.exp_maint + st.session_state.exp_ops_base + 
-                st.session_state.exp_insurance)
+with st.sidebar.expander("🏗️ 施設の定数"):
+    st.number_input("アトリエ部屋数", min_value=0, step=1, format="%d", key="atelier_rooms")
+    st.number_input("ガチャ単価", min_value=0, step=100, format="%d", key="gacha_price")
+    st.number_input("ガチャ稼働日数/年", min_value=0, max_value=366, step=1, format="%d", key="gacha_days")
+    st.number_input("ガチャ原価率(%)", min_value=0, max_value=100, step=1, format="%d", key="gacha_cost_rate")
+    st.number_input("ボランティア謝礼/人", min_value=0, step=1000, format="%d", key="volunteer_cost")
+
+# --- 収支計算 (計算式は engine.py に集約) ---
+# ウィジェットの値はスクリプト再実行前に session_state に反映済みなので、ここで一括計算できる
+calc_params = {k: st.session_state[k] for k in engine.NUMERIC_KEYS}
+calc_params.update(st.session_state.custom_events.totals)
+timer.lap("sidebar_inputs")
+calc = engine.compute(calc_params)
+timer.lap("calc")
+
+base_income = calc["base_inc"]
+base_expense = calc["base_exp"]
 
 # --- メイン：事業収支 ---
-tab_asobi, tab_facility, tab_shop, tab_camp, tab_ex, tab_custom = st.tabs([
-    "🎨 あそびっグラボ", "🏢 施設利用(アトリエ等)", "🛍️ 常設・ショップ", "⛺ 宿泊・体験", "🖼️ 企画展", "🎪 カスタムイベント"
-])
+tab_asobi, tab_facility, tab_shop, tab_camp, tab_ex, tab_custom, tab_risk, tab_sweep, tab_proj, tab_goal, tab_opt, tab_compare, tab_portfolio = st.tabs([
+    "🎨 あそびっグラボ", "🏢 施設利用(アトリエ等)", "🛍️ 常設・ショップ", "⛺ 宿泊・体験", "🖼️ 企画展", "🎪 カスタムイベント",
+    "🎲 リスク分析", "📈 感度分析", "📅 長期推移", "🎯 目標達成", "🧮 料金の最適化", "🗂️ シナリオ比較", "🏬 複数施設"
+], key="main_tab", on_change="rerun")  # 選んでいるタブを .open で知り、重い分析タブは開いているときだけ計算する
 
 # ① あそびっグラボ
 with tab_asobi:
@@ -155,9 +427,8 @@ with tab_asobi:
         st.markdown('<p class="exp-text">🔴 支出項目</p>', unsafe_allow_html=True)
         st.number_input("材料費など (年額)", step=10000, format="%d", key="asobi_mat_cost")
 
-    asobi_income = (st.session_state.asobi_price_daily * st.session_state.asobi_daily_users) + \
-                   (st.session_state.asobi_price_annual * st.session_state.asobi_annual_users)
-    asobi_expense = st.session_state.asobi_mat_cost
+    asobi_income = calc["asobi_inc"]
+    asobi_expense = calc["asobi_exp"]
     
     st.markdown("---")
     st.text_area("📝 メモ・備考", key="memo_asobi")
@@ -172,30 +443,30 @@ with tab_facility:
     col_f1, col_f2 = st.columns(2)
     
     with col_f1:
-        st.markdown('<p class="inc-text">🔵 貸しアトリエ (全7部屋)</p>', unsafe_allow_html=True)
+        st.markdown(f'<p class="inc-text">🔵 貸しアトリエ (全{st.session_state.atelier_rooms}部屋)</p>', unsafe_allow_html=True)
         st.number_input("1部屋 月額(円)", step=1000, format="%d", key="atelier_price")
         st.slider("入居率 (%)", 0, 100, key="atelier_rate")
         
-        atelier_income = 7 * st.session_state.atelier_price * 12 * (st.session_state.atelier_rate / 100)
-        st.metric("アトリエ年間収入", f"¥{atelier_income:,.0f}", help="7部屋×月額×12ヶ月×入居率")
+        atelier_income = calc["atelier_inc"]
+        st.metric("アトリエ年間収入", f"¥{atelier_income:,.0f}", help="部屋数×月額×12ヶ月×入居率")
 
     with col_f2:
         st.markdown('<p class="inc-text">🔵 グランド利用</p>', unsafe_allow_html=True)
         st.number_input("1回あたり単価(円)", step=100, format="%d", key="ground_price")
         st.number_input("年間利用回数", step=10, format="%d", key="ground_count")
         
-        ground_income = st.session_state.ground_price * st.session_state.ground_count
+        ground_income = calc["ground_inc"]
         st.metric("グランド年間収入", f"¥{ground_income:,.0f}")
         
-    facility_income_total = atelier_income + ground_income
+    facility_income_total = calc["facility_inc"]
     
     st.markdown("---")
     st.text_area("📝 メモ・備考", key="memo_facility")
     
     fc1, fc2, fc3 = st.columns(3)
     fc1.metric("収入計", f"¥{facility_income_total:,.0f}")
-    fc2.metric("支出計", "¥0")
-    fc3.metric("利益", f"¥{facility_income_total:,.0f}")
+    fc2.metric("支出計", f"¥{calc['facility_exp']:,.0f}")
+    fc3.metric("利益", f"¥{facility_income_total - calc['facility_exp']:,.0f}")
 
 # ③ 常設・ショップ
 with tab_shop:
@@ -224,15 +495,8 @@ with tab_shop:
         st.number_input("WS単価", step=100, format="%d", key="ws_price")
     
     # 計算
-    shop_inc_total = (st.session_state.sales_agri * 12) + (st.session_state.sales_craft * 12) + (st.session_state.sales_art * 12) + \
-                     (500 * st.session_state.gacha_units * st.session_state.gacha_per_day * 250) + \
-                     (st.session_state.ws_users * st.session_state.ws_price)
-                     
-    shop_exp_total = (st.session_state.sales_agri * 12 * (1 - st.session_state.rate_agri/100)) + \
-                     (st.session_state.sales_craft * 12 * (1 - st.session_state.rate_craft/100)) + \
-                     (st.session_state.sales_art * 12 * (1 - st.session_state.rate_art/100)) + \
-                     (500 * st.session_state.gacha_units * st.session_state.gacha_per_day * 250 * 0.8) + \
-                     (st.session_state.ws_users * st.session_state.ws_price * (st.session_state.ws_mat_rate/100))
+    shop_inc_total = calc["shop_inc"]
+    shop_exp_total = calc["shop_exp"]
 
     st.markdown("---")
     st.text_area("📝 メモ・備考", key="memo_shop")
@@ -254,8 +518,8 @@ with tab_camp:
         st.number_input("夜間手当/回", step=1000, format="%d", key="night_staff_cost")
         st.number_input("設備維持費(年)", step=1000, format="%d", key="camp_maint_cost")
     
-    camp_inc = (st.session_state.camp_groups * st.session_state.camp_price) + st.session_state.camp_option
-    camp_exp = (st.session_state.camp_groups * st.session_state.night_staff_cost) + st.session_state.camp_maint_cost
+    camp_inc = calc["camp_inc"]
+    camp_exp = calc["camp_exp"]
     
     st.markdown("---")
     st.text_area("📝 メモ・備考", key="memo_camp")
@@ -271,14 +535,15 @@ with tab_ex:
         st.markdown('<p class="inc-text">🔵 収入項目</p>', unsafe_allow_html=True)
         st.number_input("観覧料 (円)", step=100, format="%d", key="ex_fee")
         st.number_input("有料入場者数 (人)", step=10, format="%d", key="ex_visitors")
-        ex_inc = st.session_state.ex_visitors * st.session_state.ex_fee
+        ex_inc = calc["ex_inc"]
     with ce2:
         st.markdown('<p class="exp-text">🔴 支出項目</p>', unsafe_allow_html=True)
         st.number_input("1. 作品賃借料", step=10000, format="%d", key="ex_rental_cost")
         st.number_input("2. 材料費", step=5000, format="%d", key="ex_mat_cost")
         st.number_input("3. 広告宣伝費", step=10000, format="%d", key="ex_ad_cost")
-        st.number_input("4. ボランティア人数(1万円/人)", step=1, format="%d", key="ex_vol_count")
-        ex_exp = st.session_state.ex_rental_cost + st.session_state.ex_mat_cost + st.session_state.ex_ad_cost + (st.session_state.ex_vol_count * 10000)
+        st.number_input("4. ボランティア人数", step=1, format="%d", key="ex_vol_count")
+        st.caption(f"謝礼 {st.session_state.volunteer_cost:,}円/人 (施設の定数で変更)")
+        ex_exp = calc["ex_exp"]
 
     st.markdown("---")
     st.text_area("📝 メモ・備考", key="memo_ex")
@@ -288,10 +553,10 @@ with tab_ex:
     bc3.metric("利益", f"¥{ex_inc - ex_exp:,.0f}")
 
 # ⑥ カスタムイベント
-custom_event_income = 0
-custom_event_expense = 0
-custom_event_memos = []
+custom_event_income = calc["custom_inc"]
+custom_event_expense = calc["custom_exp"]
 with tab_custom:
+    ev_store = st.session_state.custom_events
     with st.form("add_event", clear_on_submit=True):
         c1, c2, c3, c4 = st.columns(4)
         n = c1.text_input("イベント名")
@@ -300,35 +565,462 @@ with tab_custom:
         c3.markdown('<span class="exp-text">🔴 支出</span>', unsafe_allow_html=True)
         e = c3.number_input("金額", step=10000, format="%d", key="cust_e")
         m = c4.text_input("メモ・備考")
+        c5, c6, _ = st.columns([1, 1, 2])
+        cat = c5.selectbox("カテゴリ", list(events.CATEGORY_OPTIONS), index=len(events.CATEGORY_OPTIONS) - 1,
+                           format_func=events.CATEGORY_OPTIONS.get, help="指定したカテゴリの収支に加算します")
+        month = c6.selectbox("月 (任意)", [None] + list(range(1, 13)),
+                             format_func=lambda x: "指定なし" if x is None else f"{x}月")
         if st.form_submit_button("追加"):
             if n:
-                st.session_state.custom_events.append({"name":n, "inc":i, "exp":e, "memo":m})
+                ev_store.add(n, i, e, m, cat, month)
+                st.session_state.ev_editor_version += 1
                 st.rerun()
-    
-    if st.session_state.custom_events:
+
+    with st.expander("📥 CSV / Excel から一括追加"):
+        st.caption("列: イベント名, 収入, 支出, メモ・備考, カテゴリ(任意), 月(任意)")
+        st.file_uploader("イベント一覧", type=["csv", "xlsx"], key="ev_import", on_change=import_events)
+
+    if len(ev_store):
         st.markdown("---")
-        for idx, ev in enumerate(st.session_state.custom_events):
-            custom_event_income += ev['inc']
-            custom_event_expense += ev['exp']
-            memo_text = ev.get('memo', '')
-            if memo_text: custom_event_memos.append(f"{ev['name']}({memo_text})")
-            else: custom_event_memos.append(f"{ev['name']}")
-            
-            col_a, col_b, col_c, col_d, col_e = st.columns([2, 1, 1, 2, 0.5])
-            col_a.write(f"**{ev['name']}**")
-            col_b.write(f"収: ¥{ev['inc']:,}")
-            col_c.write(f"支: ¥{ev['exp']:,}")
-            col_d.caption(f"📝 {memo_text}")
-            if col_e.button("削除", key=f"del_{idx}"):
-                st.session_state.custom_events.pop(idx)
-                st.rerun()
+        ec1, ec2, ec3 = st.columns(3)
+        ec1.metric("イベント数", f"{len(ev_store):,}件")
+        ec2.metric("収入計 (全カテゴリ)", f"¥{ev_store.income:,.0f}")
+        ec3.metric("支出計 (全カテゴリ)", f"¥{ev_store.expense:,.0f}")
+
+        ev_page = st.number_input(f"ページ (全{ev_store.n_pages()}ページ)", min_value=1, max_value=ev_store.n_pages(),
+                                  step=1, key="ev_page") - 1
+        page_df = ev_store.page(ev_page)
+        st.data_editor(
+            # 行の位置で変更を受け取るので index は連番にする (IDは args で別に渡す)
+            page_df.assign(category=page_df["category"].map(events.CATEGORY_OPTIONS)).reset_index(drop=True),
+            num_rows="dynamic", hide_index=True, use_container_width=True,
+            key=f"ev_editor_{st.session_state.ev_editor_version}",
+            on_change=apply_event_edits, args=(list(page_df.index),),
+            column_config={
+                "name": st.column_config.TextColumn(events.COLUMN_LABELS["name"], required=True),
+                "inc": st.column_config.NumberColumn(events.COLUMN_LABELS["inc"], format="¥%d", step=1000),
+                "exp": st.column_config.NumberColumn(events.COLUMN_LABELS["exp"], format="¥%d", step=1000),
+                "memo": st.column_config.TextColumn(events.COLUMN_LABELS["memo"]),
+                "category": st.column_config.SelectboxColumn(events.COLUMN_LABELS["category"],
+                                                             options=list(events.CATEGORY_OPTIONS.values())),
+                "month": st.column_config.NumberColumn(events.COLUMN_LABELS["month"], min_value=1, max_value=12, step=1),
+            },
+        )
+        with st.expander("カテゴリ別・月別の集計"):
+            gc1, gc2 = st.columns(2)
+            gc1.dataframe(ev_store.by_category(), use_container_width=True)
+            gc2.dataframe(ev_store.by_month(), use_container_width=True)
+
+timer.lap("input_tabs")
+
+# --- 分析タブ ---
+# 分析タブの入力は上部の集計に影響しないので、フラグメントにして
+# そのタブだけを再実行する (calc_params は直前のフル実行時の値を使う)
+# active (タブが開いているか) が False のときは入力欄だけ描き、計算と図は省く
+# フラグメントだけの再実行は timer の区間に入らないので、perf.timed で「tab:〜」として別に集計する
+
+# ⑦ リスク分析 (モンテカルロ)
+@st.fragment
+@perf.timed("tab:risk")
+def risk_tab(calc_params):
+    st.info("各項目に分布を設定して大量に抽選し、最終収支のばらつきと赤字確率を求めます。")
+    mc_drivers = st.multiselect(
+        "ばらつかせる項目", list(montecarlo.DRIVERS), default=list(montecarlo.DRIVERS),
+        format_func=montecarlo.DRIVERS.get, key="mc_drivers"
+    )
+    mc_init = montecarlo.default_spec(calc_params, mc_drivers)
+    mc_spec = {}
+    for k in mc_drivers:
+        # 計画の値が変わったら、分布のパラメータを新しい現在値 ±20% の初期値に戻す
+        follow_current(f"mc_{k}", calc_params[k], [f"mc_{dist}_{name}_{k}"
+                                                   for dist, names in montecarlo.DISTRIBUTIONS.items() for name in names])
+        col_n, col_d, col_p = st.columns([2, 1, 3])
+        col_n.markdown(f"**{montecarlo.DRIVERS[k]}**  \n現在値: {calc_params[k]:,}")
+        dist = col_d.selectbox("分布", list(montecarlo.DISTRIBUTIONS), index=2, key=f"mc_dist_{k}")
+        init = mc_init[k][1]
+        init_values = {
+            "mean": init["mode"], "sd": max(init["high"] - init["low"], 0) / 4,
+            "low": init["low"], "mode": init["mode"], "high": init["high"],
+        }
+        names = montecarlo.DISTRIBUTIONS[dist]
+        pcols = col_p.columns(len(names))
+        mc_spec[k] = (dist, {
+            name: pc.number_input(name, value=float(init_values[name]), key=f"mc_{dist}_{name}_{k}",
+                                  min_value=0.0 if name == "sd" else None)
+            for name, pc in zip(names, pcols)
+        })
+
+    st.markdown("---")
+    cm1, cm2, cm3 = st.columns(3)
+    mc_n = cm1.selectbox("抽選回数", [10_000, 100_000, 1_000_000], index=1, format_func="{:,}".format, key="mc_n")
+    mc_seed = cm2.number_input("乱数シード", min_value=0, value=0, step=1, format="%d", key="mc_seed")
+    mc_parallel = cm3.checkbox("並列実行 (プロセスプール)", key="mc_parallel")
+
+    mc_errors = montecarlo.check_spec(mc_spec)
+    if mc_errors:
+        st.error("分布の設定を確認してください:\n\n" + "\n".join(f"- {e}" for e in mc_errors))
+    if st.button("シミュレーション実行", key="mc_run", disabled=bool(mc_errors)):
+        with st.spinner("計算中..."):
+            mc_result = montecarlo.run(
+                calc_params, mc_spec, mc_n, seed=int(mc_seed),
+                workers=(os.cpu_count() or 1) if mc_parallel else None
+            )
+        # 描画は最大10万件に間引き、図は実行時に一度だけ作る
+        mc_plot = mc_result["profit"][:100_000]
+        fig_mc = px.histogram(x=mc_plot, nbins=80, title=f"最終収支の分布 ({mc_result['n']:,}回)",
+                              labels={"x": "最終収支(円)"})
+        for q in ("p5", "p50", "p95"):
+            fig_mc.add_vline(x=mc_result[q], line_dash="dash", annotation_text=q.upper())
+        fig_mc.add_vline(x=0, line_color="#C62828")
+        fig_mc.update_layout(height=350, margin=dict(t=30, b=0, l=0, r=0), showlegend=False)
+        st.session_state.mc_result = mc_result
+        st.session_state.mc_fig = fig_mc
+
+    mc_result = st.session_state.get("mc_result")
+    if mc_result:
+        r1, r2, r3, r4 = st.columns(4)
+        r1.metric("P5 (悲観)", f"¥{mc_result['p5']:,.0f}")
+        r2.metric("P50 (中央値)", f"¥{mc_result['p50']:,.0f}")
+        r3.metric("P95 (楽観)", f"¥{mc_result['p95']:,.0f}")
+        r4.metric("赤字確率", f"{mc_result['deficit_prob']:.1%}")
+        st.plotly_chart(st.session_state.mc_fig, use_container_width=True)
+
+with tab_risk:
+    risk_tab(calc_params)
+
+# ⑧ 感度分析 (スイープ・トルネード)
+@st.fragment
+@perf.timed("tab:sweep")
+def sweep_tab(calc_params, active):
+    st.info("1〜2項目の範囲を振って最終収支を一覧化し、全項目の±変動による影響をランキングします。")
+    sweep_keys = engine.NUMERIC_KEYS
+    label_of = lambda k: engine.PARAM_LABELS.get(k, k)
+
+    def sweep_range(key, col):
+        v = calc_params[key]
+        if key in engine.PERCENT_KEYS:
+            lo, hi = 0, 100
+        else:
+            lo, hi = int(v * 0.5), int(v * 1.5) or 1
+        # 計画の値が変わったら、範囲を新しい現在値の ±50% に戻す
+        follow_current(f"sw_{key}", v, [f"sw_lo_{key}", f"sw_hi_{key}"])
+        c_lo, c_hi, c_n = col.columns(3)
+        lo = c_lo.number_input("最小", value=lo, step=1, format="%d", key=f"sw_lo_{key}")
+        hi = c_hi.number_input("最大", value=hi, step=1, format="%d", key=f"sw_hi_{key}")
+        n = c_n.number_input("分割数", min_value=2, max_value=201, value=21, step=1, format="%d", key=f"sw_n_{key}")
+        return tuple(np.linspace(lo, hi, int(n)))
+
+    sw1, sw2 = st.columns(2)
+    x_key = sw1.selectbox("横軸の項目", sweep_keys, index=sweep_keys.index("asobi_price_daily"),
+                          format_func=label_of, key="sw_x")
+    x_values = sweep_range(x_key, sw1)
+    y_options = [None] + [k for k in sweep_keys if k != x_key]
+    y_default = y_options.index("asobi_daily_users") if "asobi_daily_users" in y_options else 0
+    y_key = sw2.selectbox("縦軸の項目 (任意)", y_options, index=y_default,
+                          format_func=lambda k: "なし" if k is None else label_of(k), key="sw_y")
+    y_values = sweep_range(y_key, sw2) if y_key else None
+    pct = st.slider("トルネード図の変動幅 (±%)", 1, 50, 10, key="sw_pct")
+    if not active:  # 入力欄だけ描いて値を保ち、計算と図はタブを開いたときに作る
+        return
+
+    st.plotly_chart(build_sweep_chart(calc_params, x_key, x_values, y_key, y_values), use_container_width=True)
+    with st.expander("グリッドの明細 (カテゴリ別)"):
+        st.dataframe(cached_grid(calc_params, x_key, x_values, y_key, y_values), use_container_width=True)
+
+    st.markdown("---")
+    st.plotly_chart(build_tornado_chart(calc_params, pct), use_container_width=True)
+
+with tab_sweep:
+    sweep_tab(calc_params, tab_sweep.open)
+
+# ⑨ 長期推移 (月次プロジェクション)
+@st.fragment
+@perf.timed("tab:projection")
+def projection_tab(calc_params, active):
+    st.info("現在の年間計画を月次に展開し、成長率・物価上昇・季節変動・期中の変更を反映した資金推移を計算します。")
+    pj_a = projection.default_assumptions()
+    line_labels = {"base": "基礎(指定管理等)", **{c: engine.CATEGORY_LABELS[c] for c in projection.GROWTH_LINES if c != "base"}}
+
+    pj1, pj2 = st.columns(2)
+    pj_horizon = pj1.selectbox("期間", projection.HORIZON_CHOICES, format_func=lambda m: f"{m // 12}年 ({m}ヶ月)", key="pj_horizon")
+    pj_a["opening_cash"] = pj2.number_input("期首資金残高", value=0, step=100000, format="%d", key="pj_opening")
+
+    st.markdown("**成長率 (年率%) と季節変動**")
+    for line in projection.GROWTH_LINES:
+        lc1, lc2, lc3 = st.columns([1.5, 1, 2])
+        lc1.write(line_labels[line])
+        pj_a["growth"][line] = lc2.number_input("成長率(%)", value=0.0, step=0.5, key=f"pj_growth_{line}",
+                                                label_visibility="collapsed")
+        # 宿泊のメモ(8月・10月が繁忙期)をプリセットで表現できる
+        preset = lc3.selectbox("季節変動", list(projection.SEASONAL_PRESETS), key=f"pj_season_{line}",
+                               index=1 if line == "camp" else 0, label_visibility="collapsed")
+        pj_a["seasonality"][line] = projection.SEASONAL_PRESETS[preset]
+
+    st.markdown("**物価上昇率 (年率%)**")
+    ic1, ic2, ic3 = st.columns(3)
+    pj_a["inflation"]["wage"] = ic1.number_input("人件費", value=0.0, step=0.5, key="pj_inf_wage")
+    pj_a["inflation"]["utility"] = ic2.number_input("光熱水費", value=0.0, step=0.5, key="pj_inf_utility")
+    pj_a["inflation"]["general"] = ic3.number_input("その他固定費", value=0.0, step=0.5, key="pj_inf_general")
+
+    st.markdown("**期中の前提変更** (指定した月から値を置き換え)")
+    pj_changes = st.data_editor(
+        pd.DataFrame({"month": pd.Series(dtype="int"), "key": pd.Series(dtype="str"), "value": pd.Series(dtype="float")}),
+        num_rows="dynamic", use_container_width=True, key="pj_changes",
+        column_config={
+            "month": st.column_config.NumberColumn("開始月(0〜)", min_value=0, step=1),
+            "key": st.column_config.SelectboxColumn("項目", options=engine.NUMERIC_KEYS),
+            "value": st.column_config.NumberColumn("新しい値"),
+        },
+    )
+    pj_a["changes"] = pj_changes.dropna().to_dict("records")
+    if not active:
+        return
+
+    if "pj_model" not in st.session_state:
+        st.session_state.pj_model = projection.Projection(pj_horizon)
+    pj_start = st.session_state.pj_model.update(calc_params, pj_a, pj_horizon)
+    df_proj = st.session_state.pj_model.frame
+    st.caption(f"再計算: {pj_start}ヶ月目以降" if pj_start < pj_horizon else "再計算なし (前回結果を利用)")
+
+    st.plotly_chart(build_projection_chart(df_proj), use_container_width=True)
+    with st.expander("年度別集計"):
+        st.dataframe(projection.annual_summary(df_proj), use_container_width=True)
+
+with tab_proj:
+    projection_tab(calc_params, tab_proj.open)
+
+# ⑩ 目標達成 (ゴールシーク)
+@st.fragment
+@perf.timed("tab:goal")
+def goal_tab(calc_params, active):
+    st.info("最終収支などの目標を満たすために、選んだ項目をいくつにすればよいかを逆算します。")
+    gs1, gs2, gs3 = st.columns(3)
+    gs_key = gs1.selectbox("求める項目", engine.NUMERIC_KEYS, index=engine.NUMERIC_KEYS.index("ex_visitors"),
+                           format_func=lambda k: engine.PARAM_LABELS.get(k, k), key="gs_key")
+    gs_dir = gs2.radio("求めるもの", ["min", "max"], horizontal=True, key="gs_dir",
+                       format_func={"min": "最小値", "max": "最大値"}.get)
+    gs_target = gs3.number_input("最終収支の目標 (以上)", value=0, step=100000, format="%d", key="gs_target")
+
+    st.caption("追加の制約 (任意・すべて同時に満たす)")
+    gs_extra = st.data_editor(
+        pd.DataFrame({"metric": pd.Series(dtype="str"), "op": pd.Series(dtype="str"), "target": pd.Series(dtype="float")}),
+        num_rows="dynamic", use_container_width=True, key="gs_extra",
+        column_config={
+            "metric": st.column_config.SelectboxColumn("指標", options=goalseek.METRICS),
+            "op": st.column_config.SelectboxColumn("条件", options=[">=", "<="]),
+            "target": st.column_config.NumberColumn("目標値"),
+        },
+    )
+    gs_constraints = [("profit", ">=", gs_target)] + [
+        (r["metric"], r["op"], r["target"]) for r in gs_extra.dropna().to_dict("records")
+    ]
+    if not active:
+        return
+
+    gs_res = goalseek.solve(calc_params, gs_key, gs_constraints, direction=gs_dir)
+    gs_label = engine.PARAM_LABELS.get(gs_key, gs_key)
+    if not gs_res["feasible"]:
+        st.error(f"「{gs_label}」をどの値にしても目標を満たせません。")
+    elif gs_res["unbounded"]:
+        st.success(f"「{gs_label}」は {gs_res['interval'][0]:,.0f} 以上なら上限なく目標を満たします。")
+    else:
+        gr1, gr2, gr3 = st.columns(3)
+        gr1.metric(f"{gs_label} ({'最小' if gs_dir == 'min' else '最大'})", f"{gs_res['value']:,.0f}",
+                   delta=f"{gs_res['value'] - calc_params[gs_key]:,.0f}")
+        gr2.metric("そのときの最終収支", f"¥{gs_res['result']['profit']:,.0f}")
+        if gr3.button("この値を入力に反映", key="gs_apply", on_click=apply_value, args=(gs_key, gs_res["value"])):
+            st.rerun()  # 入力欄と上部の集計はフラグメントの外にあるので全体を再実行する
+
+with tab_goal:
+    goal_tab(calc_params, tab_goal.open)
+
+# ⑪ 料金の最適化
+@st.fragment
+@perf.timed("tab:optimize")
+def optimize_tab(calc_params, active):
+    st.info("料金・手数料率を範囲内で動かし、最終収支が最大になる案 (または目標に最小の値上げで届く案) を探します。"
+            "弾力性を入れると料金に応じて利用者数などが増減し、利用量の上限で頭打ちになります。")
+    op1, op2 = st.columns([2, 1])
+    op_mode = op1.radio("目的", ["max", "target"], horizontal=True, key="op_mode",
+                        format_func={"max": "最終収支を最大化", "target": "目標に最小の値上げで届かせる"}.get)
+    op_target = op2.number_input("最終収支の目標", value=5000000,
+                                 step=100000, format="%d", key="op_target", disabled=op_mode != "target")
+
+    # ラインごとの探索範囲・弾力性・利用量の上限 (編集可能)
+    op_rows = []
+    for line, (price_key, volume_key) in optimize.LINES.items():
+        lo, hi = optimize.price_bounds(calc_params, price_key)
+        op_rows.append({
+            "line": optimize.LINE_LABELS[line], "use": True, "price": engine.PARAM_LABELS[price_key],
+            "current": calc_params[price_key], "lo": lo, "hi": hi, "elasticity": 0.0,
+            "capacity": optimize.capacity_of(volume_key),
+        })
+    op_table = st.data_editor(
+        pd.DataFrame(op_rows, index=list(optimize.LINES)), hide_index=True, use_container_width=True, key="op_table",
+        disabled=["line", "price", "current"],
+        column_config={
+            "line": st.column_config.TextColumn("対象"),
+            "use": st.column_config.CheckboxColumn("動かす"),
+            "price": st.column_config.TextColumn("料金・手数料"),
+            "current": st.column_config.NumberColumn("現在", format="%d"),
+            "lo": st.column_config.NumberColumn("下限", min_value=0, format="%d"),
+            "hi": st.column_config.NumberColumn("上限", min_value=0, format="%d"),
+            "elasticity": st.column_config.NumberColumn("価格弾力性", min_value=0.0, step=0.1, format="%.1f",
+                                                        help="料金が1%上がると利用量が何%減るか (0 なら利用量は変わらない)"),
+            "capacity": st.column_config.NumberColumn("利用量の上限", min_value=0, format="%d",
+                                                      help="アトリエは入居率(%)、宿泊は組数/年。空欄なら上限なし"),
+        },
+    )
+    op_table.index = list(optimize.LINES)
+    if not active:
+        return
+    op_lines = [line for line in optimize.LINES if op_table.at[line, "use"]]
+    if not op_lines:
+        st.caption("動かす項目を選んでください。")
+        return
+    op_bounds = {optimize.LINES[l][0]: (op_table.at[l, "lo"], op_table.at[l, "hi"]) for l in op_lines}
+    op_elasticity = {l: float(op_table.at[l, "elasticity"] or 0) for l in op_lines}
+    op_capacity = {optimize.LINES[l][1]: None if pd.isna(op_table.at[l, "capacity"]) else op_table.at[l, "capacity"]
+                   for l in op_lines}
+
+    if op_mode == "max":
+        op_plan = optimize.maximize(calc_params, op_lines, op_bounds, op_elasticity, op_capacity)
+    else:
+        op_plan = optimize.reach_target(calc_params, op_target, op_lines, op_bounds, op_elasticity, op_capacity)
+        if not op_plan["feasible"]:
+            st.error("この範囲では目標に届きません。最終収支が最大になる案を表示します。")
+
+    or1, or2, or3 = st.columns(3)
+    or1.metric("現在の最終収支", f"¥{op_plan['profit0']:,.0f}")
+    or2.metric("最適案の最終収支", f"¥{op_plan['result']['profit']:,.0f}",
+               delta=f"{op_plan['result']['profit'] - op_plan['profit0']:,.0f}")
+    op_diff = optimize.diff(calc_params, op_plan)
+    if len(op_diff) == 1:
+        st.success("現在の入力がすでに最適です。")
+        return
+    if or3.button("この案を入力に反映", key="op_apply", on_click=apply_values, args=(op_plan["values"],)):
+        st.rerun()  # 入力欄と上部の集計はフラグメントの外にあるので全体を再実行する
+    st.dataframe(op_diff.style.format({"現在": "{:,.0f}", "最適案": "{:,.0f}", "差": "{:+,.0f}"}),
+                 hide_index=True, use_container_width=True)
+
+with tab_opt:
+    optimize_tab(calc_params, tab_opt.open)
+
+# ⑫ シナリオ比較
+@st.fragment
+@perf.timed("tab:compare")
+def compare_tab(calc_params, active):
+    st.info("保存済みの設定ファイルを複数(またはzipでまとめて)読み込み、一括で計算して並べて比較します。")
+    cmp_files = st.file_uploader("設定ファイル (json / zip)", type=["json", "zip"],
+                                 accept_multiple_files=True, key="cmp_files")
+    cmp_configs, cmp_errors, cmp_warnings = cached_load_configs(tuple((f.name, f.getvalue()) for f in cmp_files or []))
+    if cmp_warnings:
+        with st.expander(f"ℹ️ 注意のあるファイル ({len(cmp_warnings)}件)"):
+            for name, warns in cmp_warnings.items():
+                st.write(f"**{name}**: " + " / ".join(warns))
+    if cmp_errors:
+        with st.expander(f"⚠️ 読み込めなかったファイル ({len(cmp_errors)}件)", expanded=True):
+            for name, errs in cmp_errors.items():
+                st.write(f"**{name}**: " + " / ".join(errs))
+
+    cmp_configs = dict(cmp_configs)
+    if st.checkbox("現在の画面の設定も比較に含める", value=True, key="cmp_current"):
+        cmp_configs = {"現在の画面": current_config(), **cmp_configs}
+
+    db_names = list(cached_scenario_list()["name"])
+    cmp_db = st.multiselect("サーバーに保存したシナリオ (最新版)", db_names, key="cmp_db")
+
+    cmp_names = list(cmp_configs) + [f"🗄️ {n}" for n in cmp_db]
+    if cmp_names:
+        cc1, cc2 = st.columns(2)
+        cmp_base = cc1.selectbox("基準シナリオ", cmp_names, key="cmp_base")
+        cmp_value = cc2.radio("比較する値", ["収支差益", "収入", "支出"], horizontal=True, key="cmp_value")
+        if not active:
+            return
+
+        cmp_stored = {f"🗄️ {n}": get_scenario_store().load(n) for n in cmp_db}
+        # 画面・ファイルの設定はその場で計算し、保存済みシナリオだけ共有キャッシュから引く
+        # (編集中の設定の結果をキャッシュに溜めない)
+        cmp_parts = []
+        if cmp_configs:
+            cmp_parts.append(compare.evaluate_configs(cmp_configs))
+        if cmp_stored:
+            cmp_parts.append(get_scenario_store().results(cmp_stored))
+        cmp_results = pd.concat(cmp_parts)
+        cmp_configs = {**cmp_configs, **cmp_stored}
+
+        st.dataframe(compare.side_by_side(cmp_results, cmp_value).style.format("¥{:,.0f}"),
+                     use_container_width=True)
+
+        st.plotly_chart(build_compare_chart(cmp_results, cmp_base, cmp_value), use_container_width=True)
+
+        st.button(f"📑 比較中の{len(cmp_configs)}シナリオを報告書にまとめる (Excel)", on_click=start_report,
+                  key="cmp_report_start",
+                  args=("cmp_report_job", cmp_configs, f"シナリオ比較{datetime.date.today():%Y%m%d}.xlsx"))
+        report_status("cmp_report_job")
+
+with tab_compare:
+    compare_tab(calc_params, tab_compare.open)
+
+# ⑬ 複数施設 (ポートフォリオ)
+@st.fragment
+@perf.timed("tab:portfolio")
+def portfolio_tab(calc_params):
+    st.info("複数の施設の設定を登録し、全施設の連結収支と施設ごとの内訳を確認します。")
+    pf = st.session_state.portfolio
+
+    pa1, pa2 = st.columns(2)
+    with pa1:
+        pf_name = st.text_input("施設名", value=st.session_state.creator_name, key="pf_name")
+        if st.button("現在の画面の設定を施設として登録", key="pf_add", disabled=not pf_name):
+            pf.set(pf_name, current_config())
+    with pa2:
+        st.file_uploader("施設の設定ファイル (json / zip)", type=["json", "zip"], accept_multiple_files=True,
+                         key="pf_files", on_change=import_facilities)
+
+    if not len(pf):
+        st.caption("施設が登録されていません。")
+        return
+
+    st.markdown("---")
+    pk1, pk2, pk3, pk4 = st.columns(4)
+    pk1.metric("施設数", f"{len(pf)}")
+    pk2.metric("連結 総収入", f"¥{pf.totals['total_revenue']:,.0f}")
+    pk3.metric("連結 総支出", f"¥{pf.totals['total_expense']:,.0f}")
+    pk4.metric("連結 最終収支", f"¥{pf.totals['profit']:,.0f}")
+
+    df_pf = pf.category_profit().reset_index().melt(id_vars="facility", var_name="項目", value_name="収支差益")
+    fig_pf = px.bar(df_pf, x="facility", y="収支差益", color="項目", title="施設別・カテゴリ別 収支差益",
+                    labels={"facility": "施設"})
+    fig_pf.update_layout(height=350, margin=dict(t=30, b=0, l=0, r=0))
+    st.plotly_chart(fig_pf, use_container_width=True)
+
+    st.markdown("#### 連結 収支明細")
+    st.dataframe(pf.consolidated().style.format({"収入": "¥{:,.0f}", "支出": "¥{:,.0f}", "収支差益": "¥{:,.0f}"}),
+                 hide_index=True, use_container_width=True)
+
+    st.markdown("#### 施設ごとの明細")
+    pd1, pd2 = st.columns([3, 1])
+    pf_pick = pd1.selectbox("施設", pf.names, key="pf_pick")
+    pd2.button("この施設を削除", key="pf_remove", on_click=pf.remove, args=(pf_pick,))
+    st.dataframe(pf.facility_detail(pf_pick).style.format({"収入": "¥{:,.0f}", "支出": "¥{:,.0f}", "収支差益": "¥{:,.0f}"}),
+                 hide_index=True, use_container_width=True)
+
+    st.button("📑 全施設の報告書を作成 (Excel)", on_click=start_report, key="pf_report_start",
+              args=("pf_report_job", pf.configs, f"複数施設{datetime.date.today():%Y%m%d}.xlsx"))
+    report_status("pf_report_job")
+
+with tab_portfolio:
+    portfolio_tab(calc_params)
+
+timer.lap("analysis_tabs")
 
 # ==========================================
 # 3. 集計・チャート・詳細テーブル
 # ==========================================
-total_revenue = base_income + asobi_income + facility_income_total + shop_inc_total + camp_inc + ex_inc + custom_event_income
-total_expense = base_expense + asobi_expense + shop_exp_total + camp_exp + ex_exp + custom_event_expense
-profit = total_revenue - total_expense
+total_revenue = calc["total_revenue"]
+total_expense = calc["total_expense"]
+profit = calc["profit"]
 
 # --- トップチャート ---
 with top_chart_container:
@@ -338,49 +1030,36 @@ with top_chart_container:
     k3.metric("最終収支", f"¥{profit:,.0f}", delta_color="normal" if profit >= 0 else "inverse")
 
     g1, g2, g3 = st.columns([1,1,1.5])
-    
-    df_inc_chart = pd.DataFrame({
-        "カテゴリ": ["基礎(指定管理+雑)", "あそびっグラボ", "施設利用(アトリエ等)", "常設・ショップ", "宿泊・体験", "企画展", "カスタムイベント"],
-        "金額": [base_income, asobi_income, facility_income_total, shop_inc_total, camp_inc, ex_inc, custom_event_income]
-    })
-    fig_inc = px.pie(df_inc_chart, values='金額', names='カテゴリ', title="収入内訳", hole=0.4)
-    fig_inc.update_layout(height=250, margin=dict(t=30, b=0, l=0, r=0))
+    fig_inc, fig_exp, fig_bar = build_summary_charts(
+        (base_income, asobi_income, facility_income_total, shop_inc_total, camp_inc, ex_inc, custom_event_income),
+        (base_expense, asobi_expense, calc["facility_exp"], shop_exp_total, camp_exp, ex_exp, custom_event_expense),
+    )
     g1.plotly_chart(fig_inc, use_container_width=True)
-
-    df_exp_chart = pd.DataFrame({
-        "カテゴリ": ["基礎(人件費等)", "あそびグラボ費", "ショップ原価", "宿泊費", "企画展費", "イベント費"],
-        "金額": [base_expense, asobi_expense, shop_exp_total, camp_exp, ex_exp, custom_event_expense]
-    })
-    fig_exp = px.pie(df_exp_chart, values='金額', names='カテゴリ', title="支出内訳", hole=0.4,
-                     color_discrete_sequence=px.colors.sequential.Reds_r)
-    fig_exp.update_layout(height=250, margin=dict(t=30, b=0, l=0, r=0))
     g2.plotly_chart(fig_exp, use_container_width=True)
-
-    df_balance = pd.DataFrame({
-        "種別": ["収入", "支出"],
-        "金額": [total_revenue, total_expense]
-    })
-    fig_bar = px.bar(df_balance, x="金額", y="種別", orientation='h', color="種別", title="全体収支バランス",
-                     color_discrete_map={"収入":"#1f77b4", "支出":"#C62828"}, text_auto=',.0f')
-    fig_bar.update_layout(height=250, margin=dict(t=30, b=0, l=0, r=0))
     g3.plotly_chart(fig_bar, use_container_width=True)
+timer.lap("charts")
 
 # --- ページ下部：詳細収支テーブル ---
 st.markdown("### 📋 カテゴリ別 収支明細表")
-custom_events_str = "、".join(custom_event_memos) if custom_event_memos else "なし"
-detail_data = [
-    ["基礎数値(指定管理・雑)", base_income, base_expense, base_income - base_expense, "-"],
-    ["あそびっグラボ", asobi_income, asobi_expense, asobi_income - asobi_expense, st.session_state.memo_asobi],
-    ["施設利用(アトリエ等)", facility_income_total, 0, facility_income_total, st.session_state.memo_facility],
-    ["常設・ショップ", shop_inc_total, shop_exp_total, shop_inc_total - shop_exp_total, st.session_state.memo_shop],
-    ["宿泊・体験", camp_inc, camp_exp, camp_inc - camp_exp, st.session_state.memo_camp],
-    ["企画展", ex_inc, ex_exp, ex_inc - ex_exp, st.session_state.memo_ex],
-    ["カスタムイベント", custom_event_income, custom_event_expense, custom_event_income - custom_event_expense, custom_events_str],
-    ["★ 合計", total_revenue, total_expense, profit, ""]
-]
-df_detail = pd.DataFrame(detail_data, columns=["項目", "収入", "支出", "収支差益", "備考"])
+custom_events_str = st.session_state.custom_events.memo_summary()
+memos = tuple((k, st.session_state[k]) for k in engine.CATEGORY_MEMO_KEYS.values())
+df_detail = build_detail_frame(tuple(calc.items()), memos, custom_events_str)
 st.dataframe(
     df_detail.style.format({"収入": "¥{:,.0f}", "支出": "¥{:,.0f}", "収支差益": "¥{:,.0f}"})
-    .applymap(lambda x: 'color: red;' if isinstance(x, (int, float)) and x < 0 else 'color: blue;' if isinstance(x, (int, float)) else '', subset=['収支差益']),
+    .map(lambda x: 'color: red;' if isinstance(x, (int, float)) and x < 0 else 'color: blue;' if isinstance(x, (int, float)) else '', subset=['収支差益']),
     use_container_width=True
 )
+timer.lap("table")
+
+# ==========================================
+# サイドバー：パフォーマンス計測 (デバッグ用)
+# ==========================================
+st.sidebar.markdown("---")
+if st.sidebar.checkbox("⏱ 処理時間を表示", key="show_perf"):
+    perf_df = pd.DataFrame({"区間": list(timer.sections), "ms": [v * 1000 for v in timer.sections.values()]})
+    st.sidebar.dataframe(perf_df.style.format({"ms": "{:.1f}"}), hide_index=True, use_container_width=True)
+    st.sidebar.caption(f"合計 {timer.total * 1000:.1f} ms")
+    with st.sidebar.expander("プロセス全体の集計"):
+        st.dataframe(pd.DataFrame(perf.snapshot()).T, use_container_width=True)
+    st.sidebar.download_button("計測結果 (JSON)", perf.to_json(timer), "perf.json", "application/json")
+    st.sidebar.download_button("計測結果 (Prometheus)", perf.to_prometheus(), "perf.prom", "text/plain")
@@ -0,0 +1,215 @@
+import numpy as np
+import pandas as pd
+
+import engine
+
+# ==========================================
+# 料金・手数料の最適化
+# ==========================================
+# 料金 (price) と、それに応じて変わる利用量 (volume) の組を「ライン」として扱う。
+# 利用量は価格弾力性の曲線で料金から決まり、受け入れ上限 (capacity) で頭打ちになる。
+# engine の計算式ではライン同士の交差項がないので、最終収支は
+# 「現在の収支 + ラインごとの増減」に分解できる。そこでラインごとに
+# 料金の範囲を格子状に並べて engine.compute で一括評価し (1ライン1回の配列計算)、
+# 最大化はラインごとの最大値、目標達成は値上げ幅の合計を最小にする配分
+# (ラグランジュ緩和 + 二分法) で解く。
+
+LINES = {
+    "asobi_daily": ("asobi_price_daily", "asobi_daily_users"),
+    "asobi_annual": ("asobi_price_annual", "asobi_annual_users"),
+    "atelier": ("atelier_price", "atelier_rate"),
+    "camp": ("camp_price", "camp_groups"),
+    "ex": ("ex_fee", "ex_visitors"),
+    "agri": ("rate_agri", "sales_agri"),
+    "craft": ("rate_craft", "sales_craft"),
+    "art": ("rate_art", "sales_art"),
+}
+LINE_LABELS = {
+    "asobi_daily": "あそび 1日利用", "asobi_annual": "あそび 年パス", "atelier": "貸しアトリエ",
+    "camp": "宿泊", "ex": "企画展", "agri": "農産物 委託", "craft": "工芸品 委託", "art": "美術品 委託",
+}
+
+# 料金の探索範囲 (現在値に対する倍率)。手数料率は PARAM_BOUNDS (0〜100%) でも制限する
+DEFAULT_PRICE_RANGE = (0.5, 2.0)
+# 利用量の上限。アトリエは入居率100% (= atelier_rooms 部屋すべて) まで
+DEFAULT_CAPACITY = {"camp_groups": 365}  # 宿泊は1日1組まで
+
+GRID_SIZE = 4001  # 1ラインあたりの格子点の数 (料金の刻みがこれより細かければ全整数を調べる)
+
+
+# --- 利用量の曲線 ---
+def volume_curve(prices, price0, volume0, elasticity=0.0):
+    """料金 prices のときの利用量を返す。
+
+    elasticity が数値なら一定弾力性 (volume0 × (price / price0) ^ -elasticity)、
+    [(料金の倍率, 利用量の倍率), ...] なら折れ線で補間する。0 なら利用量は変わらない。
+    """
+    prices = np.asarray(prices, dtype=float)
+    if price0 <= 0 or not np.any(elasticity):
+        return np.full(prices.shape, float(volume0))
+    ratio = prices / price0
+    if np.isscalar(elasticity):
+        with np.errstate(divide="ignore"):
+            return volume0 * np.power(np.maximum(ratio, 1e-9), -float(elasticity))
+    xs, ys = zip(*sorted(elasticity))
+    return volume0 * np.interp(ratio, xs, ys)
+
+
+def capacity_of(volume_key, capacity=None):
+    """利用量の上限 (None は上限なし)"""
+    capacity = capacity or {}
+    if volume_key in capacity:
+        return capacity[volume_key]
+    return DEFAULT_CAPACITY.get(volume_key, engine.PARAM_BOUNDS[volume_key][1])
+
+
+def price_bounds(base, price_key, bounds=None):
+    """料金の探索範囲 (lo, hi)。指定がなければ現在値の DEFAULT_PRICE_RANGE 倍"""
+    if bounds and price_key in bounds:
+        lo, hi = bounds[price_key]
+    else:
+        p0 = float(base[price_key])
+        lo, hi = p0 * DEFAULT_PRICE_RANGE[0], p0 * DEFAULT_PRICE_RANGE[1]
+    b_lo, b_hi = engine.PARAM_BOUNDS[price_key]
+    lo = max(float(lo), b_lo)
+    hi = float(hi) if b_hi is None else min(float(hi), b_hi)
+    return lo, max(lo, hi)
+
+
+def _grid(lo, hi):
+    """lo〜hi の整数の格子 (幅が広ければ GRID_SIZE 点に間引く)"""
+    lo, hi = int(np.ceil(lo)), int(np.floor(hi))
+    if hi - lo + 1 <= GRID_SIZE:
+        return np.arange(lo, hi + 1, dtype=float)
+    return np.unique(np.round(np.linspace(lo, hi, GRID_SIZE)))
+
+
+def _line_gain(base, line, prices, elasticity, capacity, profit0):
+    """ライン line の料金を prices にしたときの (最終収支の増減, 利用量)"""
+    price_key, volume_key = LINES[line]
+    volumes = volume_curve(prices, float(base[price_key]), float(base[volume_key]), elasticity)
+    cap = capacity_of(volume_key, capacity)
+    volumes = np.floor(np.clip(volumes, 0, cap if cap is not None else np.inf) + 1e-9)  # 入力は整数
+    params = {k: float(base[k]) for k in engine.INPUT_KEYS}
+    params[price_key] = prices
+    params[volume_key] = volumes
+    profit = np.broadcast_to(engine.compute(params)["profit"], prices.shape)
+    return profit - profit0, volumes
+
+
+def _line_table(base, line, lo, hi, elasticity, capacity, profit0):
+    """料金の格子と、各格子点の (増減, 利用量)。最大値の周りは1円刻みで調べ直す"""
+    prices = _grid(lo, hi)
+    gains, volumes = _line_gain(base, line, prices, elasticity, capacity, profit0)
+    if len(prices) > 1 and prices[1] - prices[0] > 1:
+        best = prices[int(np.argmax(gains))]
+        step = prices[1] - prices[0]
+        fine = np.arange(max(lo, best - step), min(hi, best + step) + 1, dtype=float)
+        fine_gains, fine_volumes = _line_gain(base, line, fine, elasticity, capacity, profit0)
+        prices = np.concatenate([prices, fine])
+        gains = np.concatenate([gains, fine_gains])
+        volumes = np.concatenate([volumes, fine_volumes])
+        order = np.argsort(prices, kind="stable")
+        prices, gains, volumes = prices[order], gains[order], volumes[order]
+    return prices, gains, volumes
+
+
+def _plan(base, tables, choice):
+    """各ラインの格子点 choice から最適案の入力値と計算結果を作る"""
+    values = {}
+    for line, i in choice.items():
+        price_key, volume_key = LINES[line]
+        prices, _, volumes = tables[line]
+        values[price_key] = int(prices[i])
+        values[volume_key] = int(volumes[i])
+    params = {k: float(base[k]) for k in engine.INPUT_KEYS}
+    params.update(values)
+    result = {k: float(v) for k, v in engine.compute(params).items()}
+    return values, result
+
+
+# --- 最大化・目標達成 ---
+def maximize(base, lines=None, bounds=None, elasticity=None, capacity=None):
+    """lines の料金を範囲内で動かし、最終収支が最大になる案を返す。
+
+    戻り値は dict: values (変える入力値), result (その案の計算結果), profit0 (現在の最終収支)。
+    """
+    lines = list(lines or LINES)
+    elasticity = elasticity or {}
+    profit0 = float(engine.compute({k: float(base[k]) for k in engine.INPUT_KEYS})["profit"])
+    tables, choice = {}, {}
+    for line in lines:
+        lo, hi = price_bounds(base, LINES[line][0], bounds)
+        tables[line] = _line_table(base, line, lo, hi, elasticity.get(line, 0.0), capacity, profit0)
+        choice[line] = int(np.argmax(tables[line][1]))
+    values, result = _plan(base, tables, choice)
+    return {"values": values, "result": result, "profit0": profit0, "feasible": True}
+
+
+def reach_target(base, target, lines=None, bounds=None, elasticity=None, capacity=None, tol=1e-9):
+    """最終収支 ≧ target となる案のうち、値上げ幅 (現在値に対する割合) の合計が最小のものを返す。
+
+    料金は現在値より下げない。届かない場合は feasible=False で最大化の案を返す。
+    """
+    lines = list(lines or LINES)
+    elasticity = elasticity or {}
+    profit0 = float(engine.compute({k: float(base[k]) for k in engine.INPUT_KEYS})["profit"])
+    need = target - profit0
+
+    tables, costs = {}, {}
+    for line in lines:
+        price_key = LINES[line][0]
+        p0 = float(base[price_key])
+        lo, hi = price_bounds(base, price_key, bounds)
+        prices, gains, volumes = _line_table(base, line, max(lo, p0), max(hi, p0), elasticity.get(line, 0.0),
+                                             capacity, profit0)
+        tables[line] = (prices, gains, volumes)
+        costs[line] = (prices - p0) / (p0 if p0 > 0 else max(hi, 1.0))
+
+    if need <= 0:
+        values, result = _plan(base, tables, {line: 0 for line in lines})
+        return {"values": values, "result": result, "profit0": profit0, "feasible": True}
+
+    def pick(lam):
+        return {line: int(np.argmax(tables[line][1] - lam * costs[line])) for line in lines}
+
+    def total(choice):
+        return sum(tables[line][1][i] for line, i in choice.items())
+
+    best = pick(0.0)
+    if total(best) < need:
+        result = maximize(base, lines, bounds, elasticity, capacity)
+        result["feasible"] = False
+        return result
+
+    # 値上げ1単位あたりの収支増 (lam) を二分法で決め、目標に届く範囲で値上げを最小にする
+    # (lam がこれ以上なら、どのラインも値上げしない)
+    lo, hi = 0.0, 1.0 + max((float(np.max(tables[line][1][c > 0] / c[c > 0]))
+                              for line, c in costs.items() if np.any(c > 0)), default=0.0)
+    for _ in range(100):
+        mid = (lo + hi) / 2
+        choice = pick(mid)
+        if total(choice) >= need:
+            lo, best = mid, choice
+        else:
+            hi = mid
+        if hi - lo <= tol * max(1.0, hi):
+            break
+
+    # 行き過ぎた値上げを、目標を割らない範囲でラインごとに戻す
+    for line in lines:
+        gains = tables[line][1]
+        slack = total(best) - need
+        i = best[line]
+        ok = np.flatnonzero(gains[:i + 1] >= gains[i] - slack)
+        best[line] = int(ok[0])
+    values, result = _plan(base, tables, best)
+    return {"values": values, "result": result, "profit0": profit0, "feasible": True}
+
+
+def diff(base, plan):
+    """最適案で変わる入力値と最終収支を、現在の値と並べた表"""
+    rows = [[engine.PARAM_LABELS[k], float(base[k]), float(v), float(v) - float(base[k])]
+            for k, v in plan["values"].items() if v != base[k]]
+    rows.append(["最終収支", plan["profit0"], plan["result"]["profit"], plan["result"]["profit"] - plan["profit0"]])
+    return pd.DataFrame(rows, columns=["項目", "現在", "最適案", "差"])
@@ -0,0 +1,104 @@
+import functools
+import json
+import threading
+import time
+
+# ==========================================
+# パフォーマンス計測
+# ==========================================
+# スクリプト1回の実行を区間ごとに計測する (Timer.lap)。
+# フラグメントのようにスクリプト全体とは別に再実行される関数は timed で計測する。
+# 区間ごとの回数・合計時間はプロセス全体でも集計し、
+# JSON や Prometheus のテキスト形式で書き出せるようにする。
+
+METRIC_NAME = "biglabo_section_seconds"
+
+_lock = threading.Lock()
+_totals = {}  # {区間名: [回数, 合計秒, 最大秒]}
+
+
+class Timer:
+    """直前の lap からの経過時間を区間名ごとに記録する"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._last = self.start
+        self.sections = {}
+
+    def lap(self, name):
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        self.sections[name] = self.sections.get(name, 0.0) + elapsed
+        record(name, elapsed)
+        return elapsed
+
+    @property
+    def total(self):
+        return self._last - self.start
+
+    def to_dict(self):
+        return {"sections": dict(self.sections), "total": self.total}
+
+
+def record(name, seconds):
+    """区間の計測値をプロセス全体の集計に加える"""
+    with _lock:
+        stat = _totals.setdefault(name, [0, 0.0, 0.0])
+        stat[0] += 1
+        stat[1] += seconds
+        stat[2] = max(stat[2], seconds)
+
+
+def timed(name):
+    """関数1回の実行時間を区間 name としてプロセス全体の集計に加えるデコレータ"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    """プロセス全体の集計を {区間名: {count, sum, max, mean}} で返す"""
+    with _lock:
+        return {
+            name: {"count": c, "sum": s, "max": m, "mean": s / c if c else 0.0}
+            for name, (c, s, m) in _totals.items()
+        }
+
+
+def reset():
+    with _lock:
+        _totals.clear()
+
+
+def to_json(timer=None):
+    """直近の実行 (timer) とプロセス全体の集計を JSON 文字列にする"""
+    data = {"process": snapshot()}
+    if timer is not None:
+        data["last_run"] = timer.to_dict()
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def to_prometheus():
+    """プロセス全体の集計を Prometheus のテキスト形式 (summary) にする"""
+    lines = [
+        f"# HELP {METRIC_NAME} Time spent per section of a script run.",
+        f"# TYPE {METRIC_NAME} summary",
+    ]
+    for name, st in sorted(snapshot().items()):
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'{METRIC_NAME}_count{{section="{label}"}} {st["count"]}')
+        lines.append(f'{METRIC_NAME}_sum{{section="{label}"}} {st["sum"]:.6f}')
+    lines.append(f"# HELP {METRIC_NAME}_max Longest single run per section.")
+    lines.append(f"# TYPE {METRIC_NAME}_max gauge")
+    for name, st in sorted(snapshot().items()):
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'{METRIC_NAME}_max{{section="{label}"}} {st["max"]:.6f}')
+    return "\n".join(lines) + "\n"
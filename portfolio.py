@@ -0,0 +1,96 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import engine
+
+# ==========================================
+# 複数施設のポートフォリオ
+# ==========================================
+# 施設ごとの設定 (default_values と同じ形) を1行1施設の表で持ち、
+# 計算結果と全施設の合計を保持する。施設の追加・変更・削除では
+# その施設の1行だけを計算し、合計は差分で更新する。
+
+
+class Portfolio:
+    """施設設定の一覧と、施設別・連結の計算結果を保持する"""
+
+    def __init__(self):
+        self.configs = {}
+        self.inputs = pd.DataFrame(columns=engine.INPUT_KEYS, dtype=float)
+        self.results = pd.DataFrame(columns=engine.RESULT_KEYS, dtype=float)
+        self.inputs.index.name = self.results.index.name = "facility"
+        self.totals = pd.Series(0.0, index=engine.RESULT_KEYS)
+
+    def __len__(self):
+        return len(self.configs)
+
+    def __contains__(self, name):
+        return name in self.configs
+
+    @property
+    def names(self):
+        return list(self.configs)
+
+    # --- 追加・変更・削除 (1施設分だけ再計算) ---
+    def set(self, name, config):
+        """施設を追加 (同名があれば置き換え) し、その施設の計算結果を返す"""
+        row = engine.to_frame([config])
+        row.index = pd.Index([name], name="facility")
+        result = engine.evaluate(row)
+        if name in self.configs:
+            self.totals -= self.results.loc[name, engine.RESULT_KEYS]
+        self.totals += result.iloc[0][engine.RESULT_KEYS]
+        self.configs[name] = config
+        self.inputs.loc[name] = row.iloc[0]
+        self.results.loc[name] = result.iloc[0]
+        return result.iloc[0]
+
+    def remove(self, name):
+        self.totals -= self.results.loc[name, engine.RESULT_KEYS]
+        del self.configs[name]
+        self.inputs = self.inputs.drop(index=name)
+        self.results = self.results.drop(index=name)
+
+    # --- 一括計算 ---
+    def load(self, configs, workers=None, chunk_size=1000):
+        """{施設名: 設定} をまとめて登録し、全施設を一括計算する。
+
+        workers を指定すると施設をチャンクに分けてプロセスプールで計算する。
+        """
+        self.configs = dict(configs)
+        self.inputs = engine.to_frame(list(self.configs.values()))
+        self.inputs.index = pd.Index(list(self.configs), name="facility")
+        self.results = evaluate_frame(self.inputs, workers, chunk_size)
+        self.totals = self.results[engine.RESULT_KEYS].sum()
+
+    # --- 参照 ---
+    def consolidated(self):
+        """全施設の連結明細 (df_detail と同じ形)"""
+        return engine.detail_frame(self.totals, events_memo="-")
+
+    def facility_detail(self, name):
+        """1施設分の明細 (メモ欄も設定から表示)"""
+        config = self.configs[name]
+        memos = {k: config.get(k, "") for k in engine.CATEGORY_MEMO_KEYS.values()}
+        return engine.detail_frame(self.results.loc[name], memos, events_memo="-")
+
+    def summary(self):
+        """施設ごとの総収入・総支出・最終収支"""
+        return self.results[["total_revenue", "total_expense", "profit"]]
+
+    def category_profit(self):
+        """施設 × カテゴリの収支差益"""
+        return pd.DataFrame({
+            engine.CATEGORY_LABELS[c]: self.results[f"{c}_inc"] - self.results[f"{c}_exp"]
+            for c in engine.CATEGORIES
+        })
+
+
+def evaluate_frame(frame, workers=None, chunk_size=1000):
+    """シナリオ表を計算する。workers があればチャンクに分けてプロセスプールで計算する"""
+    if not workers or workers <= 1 or len(frame) <= chunk_size:
+        return engine.evaluate(frame)
+    chunks = [frame.iloc[i:i + chunk_size] for i in range(0, len(frame), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return pd.concat(pool.map(engine.evaluate, chunks))
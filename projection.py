@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+
+import engine
+
+# ==========================================
+# 長期(10〜30年)月次収支プロジェクション
+# ==========================================
+# 年額で定義された engine の計算を月次に展開し、事業ごとの成長率・
+# 人件費/光熱水費のインフレ率・季節変動・期中の前提変更を反映した
+# 月次キャッシュフローと累積資金残高を作る。
+#
+# 各月の値はその月時点の前提だけで決まり、月をまたぐ状態は累積残高だけなので、
+# 前提変更があった月以降だけを計算し直せば済む (Projection.update)。
+
+HORIZON_CHOICES = [120, 240, 360]
+FISCAL_START_MONTH = 4   # 年度の開始月 (4月)
+
+# 成長率を与える事業ライン (base は指定管理料など基礎収入のみに適用)
+GROWTH_LINES = ["base", "asobi", "facility", "shop", "camp", "ex", "custom"]
+
+# 物価上昇率を与える固定費
+INFLATION_KEYS = {
+    "wage": ["exp_wages"],
+    "utility": ["exp_utility"],
+    "general": ["exp_maint", "exp_ops_base", "exp_insurance"],
+}
+
+FLAT = [1.0] * 12
+
+# 季節変動のプリセット (1月〜12月の相対値。平均1になるよう正規化して使う)
+SEASONAL_PRESETS = {
+    "なし(平準)": FLAT,
+    "夏・秋ピーク(8月・10月)": [0.5, 0.5, 0.8, 1.0, 1.2, 0.8, 1.2, 2.2, 1.0, 1.8, 0.6, 0.4],
+    "週末・長期休暇型": [0.9, 0.7, 1.2, 1.1, 1.3, 0.8, 1.1, 1.4, 0.9, 1.0, 0.9, 0.7],
+    "年度末集中": [0.8, 1.0, 1.6, 0.7, 0.8, 0.9, 0.9, 0.9, 1.0, 1.0, 1.0, 1.4],
+}
+
+
+def default_assumptions():
+    """前提条件の初期値 (成長・インフレなし、季節変動なし)"""
+    return {
+        "growth": dict.fromkeys(GROWTH_LINES, 0.0),     # 年率(%)
+        "inflation": dict.fromkeys(INFLATION_KEYS, 0.0),  # 年率(%)
+        "seasonality": {line: list(FLAT) for line in GROWTH_LINES},
+        "changes": [],  # [{"month": 36, "key": "ex_fee", "value": 800}, ...]
+        "opening_cash": 0.0,
+    }
+
+
+def _normalize(weights):
+    w = np.asarray(weights, dtype=float)
+    total = w.sum()
+    return w * (12 / total) if total > 0 else np.ones(12)
+
+
+def _global_part(base, assumptions):
+    """月をまたいで全体に効く前提 (変わると全期間を再計算する)"""
+    return (
+        tuple(float(base[k]) for k in engine.INPUT_KEYS),
+        tuple(sorted(assumptions["growth"].items())),
+        tuple(sorted(assumptions["inflation"].items())),
+        tuple((k, tuple(v)) for k, v in sorted(assumptions["seasonality"].items())),
+        float(assumptions.get("opening_cash", 0)),
+    )
+
+
+def _changes_by_month(assumptions):
+    changes = {}
+    for ch in assumptions.get("changes", []):
+        changes.setdefault(int(ch["month"]), []).append((ch["key"], float(ch["value"])))
+    return changes
+
+
+def compute_months(base, assumptions, months):
+    """指定した月(0始まりの配列)の月次収支を計算して DataFrame で返す"""
+    months = np.asarray(months, dtype=int)
+    n = len(months)
+    years = months // 12  # 経過年数 (0始まり)
+    cal_month = (FISCAL_START_MONTH - 1 + months) % 12 + 1
+
+    # 期中の前提変更を、その月以降に反映したパラメータ列を作る
+    params = {k: np.full(n, float(base[k])) for k in engine.INPUT_KEYS}
+    for month, items in sorted(_changes_by_month(assumptions).items()):
+        for key, value in items:
+            params[key][months >= month] = value
+
+    for kind, keys in INFLATION_KEYS.items():
+        factor = (1 + assumptions["inflation"].get(kind, 0) / 100) ** years
+        for k in keys:
+            params[k] = params[k] * factor
+
+    annual = engine.compute(params)
+
+    frame = pd.DataFrame({
+        "month": months,
+        "年度": years + 1,
+        "月": cal_month,
+    })
+    revenue = np.zeros(n)
+    expense = np.zeros(n)
+    for line in GROWTH_LINES:
+        season = _normalize(assumptions["seasonality"].get(line, FLAT))[cal_month - 1]
+        growth = (1 + assumptions["growth"].get(line, 0) / 100) ** years
+        inc = annual[f"{line}_inc"] / 12 * season * growth
+        if line == "base":
+            # 基礎の支出(固定費)はインフレ率で伸ばし、月平均で計上する
+            exp = annual["base_exp"] / 12 * np.ones(n)
+        else:
+            exp = annual[f"{line}_exp"] / 12 * season * growth
+        frame[f"{line}_inc"] = inc
+        frame[f"{line}_exp"] = exp
+        revenue += inc
+        expense += exp
+    frame["total_revenue"] = revenue
+    frame["total_expense"] = expense
+    frame["profit"] = revenue - expense
+    return frame
+
+
+class Projection:
+    """月次プロジェクションの計算結果を保持し、変更月以降だけ再計算する"""
+
+    def __init__(self, horizon=HORIZON_CHOICES[0]):
+        self.horizon = int(horizon)
+        self.frame = None
+        self._global = None
+        self._changes = None
+
+    def _dirty_from(self, base, assumptions):
+        """前回結果から再計算が必要な最初の月を返す (不要なら horizon)"""
+        if self.frame is None or len(self.frame) != self.horizon:
+            return 0
+        if _global_part(base, assumptions) != self._global:
+            return 0
+        new = _changes_by_month(assumptions)
+        old = self._changes
+        diff = [m for m in set(new) | set(old) if new.get(m) != old.get(m)]
+        return max(0, min(diff)) if diff else self.horizon
+
+    def update(self, base, assumptions, horizon=None):
+        """前提を反映して frame を更新し、再計算を始めた月を返す"""
+        if horizon is not None and int(horizon) != self.horizon:
+            self.horizon = int(horizon)
+            self.frame = None
+        start = self._dirty_from(base, assumptions)
+        if start < self.horizon:
+            tail = compute_months(base, assumptions, np.arange(start, self.horizon))
+            opening = float(assumptions.get("opening_cash", 0))
+            if start > 0:
+                opening = float(self.frame["cash"].iloc[start - 1])
+            tail["cash"] = opening + tail["profit"].cumsum()
+            if start == 0:
+                self.frame = tail
+            else:
+                self.frame = pd.concat([self.frame.iloc[:start], tail], ignore_index=True)
+        self._global = _global_part(base, assumptions)
+        self._changes = _changes_by_month(assumptions)
+        return start
+
+
+def project(base, assumptions, horizon=HORIZON_CHOICES[0]):
+    """前提から全期間の月次プロジェクションを一度に計算する"""
+    p = Projection(horizon)
+    p.update(base, assumptions)
+    return p.frame
+
+
+def annual_summary(frame):
+    """月次プロジェクションを年度ごとに集計する"""
+    cols = [c for c in frame.columns if c.endswith(("_inc", "_exp"))] + ["total_revenue", "total_expense", "profit"]
+    summary = frame.groupby("年度")[cols].sum()
+    summary["cash"] = frame.groupby("年度")["cash"].last()
+    return summary.reset_index()
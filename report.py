@@ -0,0 +1,173 @@
+import os
+import tempfile
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.chart import BarChart, PieChart, Reference
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+import engine
+import events
+
+# ==========================================
+# 報告書 (Excel) の書き出し
+# ==========================================
+# 1つ以上のシナリオ {名前: 設定} を、概要・収支明細・入力値・メモ・イベントの
+# シートを持つ Excel にまとめる。write_only で行を溜めずに書き、計算は
+# チャンクごとに engine.evaluate で一括して行うので、シナリオ数が多くても
+# メモリ使用量はチャンクサイズ分で頭打ちになる。
+# 画面からは ReportJob でバックグラウンドのスレッドに渡して作成する。一時ファイルは
+# 書き終えてバイト列に読み込んだ時点で消すので、ジョブを作り直さなくても残らない。
+
+CHUNK_SIZE = 1000
+CHART_MAX_SCENARIOS = 50  # 概要シートのグラフに載せるシナリオ数の上限
+MONEY_FORMAT = '"¥"#,##0'
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+SHEET_COLUMNS = {
+    "概要": ["シナリオ", "制作者", "総収入", "総支出", "最終収支"],
+    "収支明細": ["シナリオ"] + engine.DETAIL_COLUMNS,
+    "入力値": ["シナリオ"] + [engine.PARAM_LABELS[k] for k in engine.NUMERIC_KEYS],
+    "メモ": ["シナリオ", "区分", "内容"],
+    "イベント": ["シナリオ"] + [events.COLUMN_LABELS[c] for c in events.COLUMNS],
+}
+COLUMN_WIDTHS = {"概要": [24, 14, 16, 16, 16], "収支明細": [24, 24, 16, 16, 16, 50],
+                 "入力値": [24] + [16] * len(engine.NUMERIC_KEYS), "メモ": [24, 24, 60], "イベント": [24, 24, 14, 14, 40, 20, 8]}
+MONEY_COLUMNS = {"概要": {2, 3, 4}, "収支明細": {2, 3, 4}, "イベント": {2, 3}}
+
+
+def _header(ws, columns):
+    cells = []
+    for c in columns:
+        cell = WriteOnlyCell(ws, value=c)
+        cell.font = Font(bold=True)
+        cells.append(cell)
+    ws.append(cells)
+
+
+def _append(ws, row, money_columns=()):
+    """1行書き出す。money_columns の位置 (0始まり) は円表示にする"""
+    cells = []
+    for i, v in enumerate(row):
+        if i in money_columns:
+            v = WriteOnlyCell(ws, value=float(v))
+            v.number_format = MONEY_FORMAT
+        cells.append(v)
+    ws.append(cells)
+
+
+def _scenario_rows(name, config, result):
+    """1シナリオ分の各シートの行を {シート名: [行, ...]} で返す (行数が多くなるので DataFrame は作らない)"""
+    memos = {k: config.get(k, "") for k in engine.CATEGORY_MEMO_KEYS.values()}
+    records = config.get("custom_events", [])
+    category = events.CATEGORY_OPTIONS
+    return {
+        "概要": [[name, config.get("creator_name", ""), result["total_revenue"],
+                 result["total_expense"], result["profit"]]],
+        "収支明細": [[name, *row] for row in engine.detail_rows(result, memos, events.memo_summary(records))],
+        "入力値": [[name] + [config.get(k, engine.default_values[k]) for k in engine.NUMERIC_KEYS]],
+        "メモ": [[name, engine.CATEGORY_LABELS[c], memos[k]] for c, k in engine.CATEGORY_MEMO_KEYS.items()],
+        "イベント": [[name, r.get("name", ""), r.get("inc", 0), r.get("exp", 0), r.get("memo", ""),
+                     category.get(r.get("category", "custom"), r.get("category")), r.get("month")]
+                    for r in records],
+    }
+
+
+def _add_charts(sheets, n_scenarios):
+    """概要シートにシナリオ別の収支グラフ、1シナリオだけなら収支明細にカテゴリ別のグラフを付ける"""
+    n = min(n_scenarios, CHART_MAX_SCENARIOS)
+    if n:
+        ws = sheets["概要"]
+        chart = BarChart()
+        chart.title = "シナリオ別 収支" + (f" (先頭{n}件)" if n_scenarios > n else "")
+        chart.add_data(Reference(ws, min_col=3, max_col=5, min_row=1, max_row=n + 1), titles_from_data=True)
+        chart.set_categories(Reference(ws, min_col=1, min_row=2, max_row=n + 1))
+        chart.width, chart.height = 24, 10
+        ws.add_chart(chart, "H2")
+
+    if n_scenarios == 1:
+        ws = sheets["収支明細"]
+        last = len(engine.CATEGORIES) + 1  # 合計行はグラフに入れない
+        labels = Reference(ws, min_col=2, min_row=2, max_row=last)
+        bar = BarChart()
+        bar.title = "カテゴリ別 収入・支出"
+        bar.add_data(Reference(ws, min_col=3, max_col=4, min_row=1, max_row=last), titles_from_data=True)
+        bar.set_categories(labels)
+        bar.width, bar.height = 20, 9
+        ws.add_chart(bar, "H2")
+        for i, (col, title) in enumerate([(3, "収入の内訳"), (4, "支出の内訳")]):
+            pie = PieChart()
+            pie.title = title
+            pie.add_data(Reference(ws, min_col=col, min_row=1, max_row=last), titles_from_data=True)
+            pie.set_categories(labels)
+            pie.width, pie.height = 12, 9
+            ws.add_chart(pie, f"{'H' if i == 0 else 'P'}22")
+
+
+def write_workbook(configs, path, progress=None, chunk_size=CHUNK_SIZE):
+    """{シナリオ名: 設定} を報告書の Excel に書き出し、シナリオ数を返す。
+
+    progress(書き出し済み, 全体) を渡すとチャンクごとに呼ぶ。
+    """
+    wb = Workbook(write_only=True)
+    sheets = {}
+    for title, columns in SHEET_COLUMNS.items():
+        ws = sheets[title] = wb.create_sheet(title)
+        for i, width in enumerate(COLUMN_WIDTHS[title]):
+            ws.column_dimensions[get_column_letter(i + 1)].width = width
+        ws.freeze_panes = "A2"
+        _header(ws, columns)
+
+    names = list(configs)
+    for start in range(0, len(names), chunk_size):
+        part = names[start:start + chunk_size]
+        frame = engine.to_frame([configs[n] for n in part])
+        results = engine.evaluate(frame).to_dict("records")
+        for name, result in zip(part, results):
+            for title, rows in _scenario_rows(name, configs[name], result).items():
+                for row in rows:
+                    _append(sheets[title], row, MONEY_COLUMNS.get(title, ()))
+        if progress:
+            progress(start + len(part), len(names))
+
+    _add_charts(sheets, len(names))
+    wb.save(path)
+    return len(names)
+
+
+def build_workbook(configs, progress=None, chunk_size=CHUNK_SIZE):
+    """write_workbook と同じ報告書を一時ファイルに書き、バイト列で返す (一時ファイルは消す)"""
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        write_workbook(configs, path, progress, chunk_size)
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+class ReportJob:
+    """バックグラウンドで作成する報告書 (進み具合と、できあがった Excel のバイト列を持つ)"""
+
+    def __init__(self, executor, configs, file_name):
+        self.file_name = file_name
+        self.total = len(configs)
+        self.done = 0
+        self.future = executor.submit(build_workbook, dict(configs), self._progress)
+
+    def _progress(self, done, total):
+        self.done = done
+
+    @property
+    def finished(self):
+        return self.future.done()
+
+    def read(self):
+        """できあがった Excel のバイト列 (作成中の例外はここで送出される)"""
+        return self.future.result()
+
+    def cancel(self):
+        """まだ始まっていなければ作成を取りやめる"""
+        self.future.cancel()
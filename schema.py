@@ -0,0 +1,224 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+import engine
+
+# ==========================================
+# 設定ファイルのスキーマ (型・範囲・バージョン)
+# ==========================================
+# default_values と INPUT_BOUNDS (画面の入力欄の範囲) から項目ごとの検証関数を起動時に一度だけ作り、
+# 読み込んだ dict はキーごとに検証関数を引くだけで検証する。
+# エラーは最初の1件で止めず、ファイル内のものをすべて集めて返す。
+# 古いバージョンのファイルは MIGRATIONS で1版ずつ現在の形に移行する。
+#
+# バージョン:
+#   1: 版の記録なし (施設の定数がなく、イベントにカテゴリ・月がない)
+#   2: 施設の定数 (atelier_rooms など) と、イベントのカテゴリ・月を追加
+
+VERSION = 2
+VERSION_KEY = "schema_version"
+
+# 画面では「※旧WS項目(不要なら0)」として残している項目
+LEGACY_WS_KEYS = ["ws_users", "ws_price", "ws_mat_rate"]
+
+# イベントのカテゴリはキーでも表示名でもよい (検証時にキーにそろえる)
+EVENT_CATEGORY_KEYS = {**{engine.CATEGORY_LABELS[c]: c for c in engine.EVENT_CATEGORIES},
+                       **{c: c for c in engine.EVENT_CATEGORIES}}
+EVENT_FIELDS = {"name", "inc", "exp", "memo", "category", "month"}
+
+_INVALID = object()
+
+
+# --- 項目ごとの検証関数 ---
+def _label(key):
+    return f"{key} ({engine.PARAM_LABELS[key]})" if key in engine.PARAM_LABELS else key
+
+
+def _range_text(low, high):
+    if low is None:
+        return f"{high}以下"
+    return f"{low}〜{high}" if high is not None else f"{low}以上"
+
+
+def _int_field(key, low, high):
+    label = _label(key)
+    range_text = _range_text(low, high)
+
+    def check(v, errors, warnings):
+        if type(v) is not int:  # bool は int の派生なので type で判定する
+            if type(v) is not float or not math.isfinite(v):
+                errors.append(f"{label}: 数値ではありません ({v!r})")
+                return _INVALID
+            if not v.is_integer():
+                warnings.append(f"{label}: 小数を切り捨てました ({v})")
+            v = int(v)
+        if (low is not None and v < low) or (high is not None and v > high):
+            errors.append(f"{label}: {range_text}で指定してください ({v})")
+            return _INVALID
+        return v
+    return check
+
+
+def _str_field(key):
+    def check(v, errors, warnings):
+        if type(v) is not str:
+            errors.append(f"{key}: 文字列ではありません ({v!r})")
+            return _INVALID
+        return v
+    return check
+
+
+def _is_number(v):
+    return type(v) in (int, float) and math.isfinite(v)
+
+
+def _check_events(v, errors, warnings):
+    if type(v) is not list:
+        errors.append("custom_events: イベントのリストではありません")
+        return _INVALID
+    n_errors = len(errors)
+    normalized = []
+    for i, ev in enumerate(v):
+        if type(ev) is not dict:
+            errors.append(f"custom_events[{i}]: イベントがオブジェクトではありません")
+            continue
+        where = f"custom_events[{i}] ({ev.get('name', '名前なし')})"
+        if type(ev.get("name")) is not str:
+            errors.append(f"{where}: イベント名が文字列ではありません")
+        for f in ("inc", "exp"):
+            if f in ev and not _is_number(ev[f]):
+                errors.append(f"{where}: {f} が数値ではありません ({ev[f]!r})")
+        if type(ev.get("memo", "")) is not str:
+            errors.append(f"{where}: メモが文字列ではありません")
+        category = ev.get("category", "custom")
+        if type(category) is not str or category not in EVENT_CATEGORY_KEYS:
+            errors.append(f"{where}: 不明なカテゴリです ({category!r})")
+        elif "category" in ev and EVENT_CATEGORY_KEYS[category] != category:
+            ev = {**ev, "category": EVENT_CATEGORY_KEYS[category]}
+        month = ev.get("month")
+        if month is not None and not (type(month) is int and 1 <= month <= 12):
+            errors.append(f"{where}: 月は1〜12で指定してください ({month!r})")
+        unknown = ev.keys() - EVENT_FIELDS
+        if unknown:
+            warnings.append(f"{where}: 未知の項目を無視します ({', '.join(sorted(unknown))})")
+        normalized.append(ev)
+    return normalized if len(errors) == n_errors else _INVALID
+
+
+def _compile():
+    """default_values の型と INPUT_BOUNDS から {キー: 検証関数} を作る"""
+    fields = {}
+    for k, default in engine.default_values.items():
+        if isinstance(default, int):
+            fields[k] = _int_field(k, *engine.INPUT_BOUNDS[k])
+        elif isinstance(default, list):
+            fields[k] = _check_events
+        else:
+            fields[k] = _str_field(k)
+    return fields
+
+
+FIELDS = _compile()
+
+
+# --- バージョン間の移行 ---
+def _migrate_v1(data, warnings):
+    """1 → 2: 施設の定数は以前の固定値 (= default_values) で補われる。旧WS項目に値があれば知らせる"""
+    used = [engine.PARAM_LABELS[k] for k in LEGACY_WS_KEYS if data.get(k)]
+    if used:
+        warnings.append(f"旧WS項目 ({'・'.join(used)}) に値が入っています。"
+                        "ショップの収支に計上されるので、不要なら0にしてください")
+    return data
+
+
+MIGRATIONS = {1: _migrate_v1}  # {移行元の版: 次の版へ移す関数}
+
+
+def migrate(data, errors, warnings):
+    """data を現在の版 (VERSION) の形にする。読めない版なら errors に記録して None を返す"""
+    version = data.get(VERSION_KEY, 1)
+    if type(version) is not int or version < 1:
+        errors.append(f"{VERSION_KEY}: 不正なバージョンです ({version!r})")
+        return None
+    if version > VERSION:
+        errors.append(f"{VERSION_KEY}: このアプリより新しい版 ({version}) のファイルです (対応は{VERSION}まで)")
+        return None
+    while version < VERSION:
+        data = MIGRATIONS[version](data, warnings)
+        version += 1
+    return data
+
+
+# --- 検証 ---
+def defaults_copy():
+    """default_values の複製 (リストも別オブジェクトにする)"""
+    return {k: list(v) if isinstance(v, list) else v for k, v in engine.default_values.items()}
+
+
+def validate(data):
+    """読み込んだ dict を検証して default_values の形にそろえ、(設定, エラー一覧, 注意一覧) を返す。
+
+    エラーが1件でもあれば設定は None。足りないキーはデフォルト値で補い、
+    未知のキーは無視して注意に記録する。
+    """
+    errors, warnings = [], []
+    if type(data) is not dict:
+        return None, ["JSONの最上位がオブジェクトではありません"], warnings
+    data = migrate(data, errors, warnings)
+    if data is None:
+        return None, errors, warnings
+
+    cfg = defaults_copy()
+    unknown = []
+    for k, v in data.items():
+        check = FIELDS.get(k)
+        if check is None:
+            if k != VERSION_KEY:
+                unknown.append(k)
+            continue
+        value = check(v, errors, warnings)
+        if value is not _INVALID:
+            cfg[k] = value
+    if unknown:
+        warnings.append(f"未知の項目を無視しました: {', '.join(unknown)}")
+    return (None if errors else cfg), errors, warnings
+
+
+def tag(config):
+    """保存用に版を付ける"""
+    return {VERSION_KEY: VERSION, **config}
+
+
+def validate_frame(frame):
+    """シナリオ表 (1行1シナリオ、列は INPUT_KEYS の一部) を列ごとにまとめて検証する。
+
+    (正しい行だけの数値の表, エラー {シナリオ名: [...]}) を返す。
+    """
+    n = len(frame)
+    bad = np.zeros(n, dtype=bool)
+    problems = []  # (行の真偽配列, メッセージ)
+    columns = {}
+    for k in engine.INPUT_KEYS:
+        if k not in frame:
+            continue
+        values = pd.to_numeric(frame[k], errors="coerce").to_numpy(dtype=float)
+        columns[k] = values
+        missing = ~np.isfinite(values)
+        problems.append((missing, f"{_label(k)}: 数値ではありません"))
+        low, high = engine.INPUT_BOUNDS.get(k, (None, None))
+        if low is not None or high is not None:
+            with np.errstate(invalid="ignore"):
+                out = ~missing & ((values < low if low is not None else False) |
+                                  (values > high if high is not None else False))
+            problems.append((out, f"{_label(k)}: {_range_text(low, high)}で指定してください"))
+    for mask, _ in problems:
+        bad |= mask
+
+    errors = {}
+    names = list(frame.index)
+    for i in np.flatnonzero(bad):  # メッセージを作るのはエラーのある行だけ
+        errors[names[i]] = [message for mask, message in problems if mask[i]]
+    valid = pd.DataFrame(columns, index=frame.index)[~bad]
+    return valid, errors
@@ -0,0 +1,183 @@
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+import engine
+import schema
+
+# ==========================================
+# サーバー側のシナリオ保存 (SQLite)
+# ==========================================
+# シナリオ名ごとに版 (version) を積み上げて保存し、計算結果は
+# 計算に効く入力値のハッシュをキーにして共有キャッシュする。キーの先頭には計算式の版
+# (engine.FORMULA_VERSION と RESULT_KEYS) を付け、式や列が変わった後は古い結果を使わない。
+# 一覧表示ではメタデータだけを読み、設定本体は開くときに読み込む。
+
+DEFAULT_PATH = os.environ.get("BIGLABO_DB", "scenarios.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    creator TEXT,
+    latest_version INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    scenario_id INTEGER NOT NULL REFERENCES scenarios(id),
+    version INTEGER NOT NULL,
+    config_json TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    creator TEXT,
+    note TEXT,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (scenario_id, version)
+);
+CREATE TABLE IF NOT EXISTS results (
+    input_hash TEXT PRIMARY KEY,
+    result_json TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _hash(obj):
+    return hashlib.sha256(json.dumps(obj, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# 計算結果キャッシュのキーの先頭 (計算式の版と結果の列から作る)
+RESULT_PREFIX = _hash([engine.FORMULA_VERSION, engine.RESULT_KEYS])[:16] + ":"
+
+
+def input_hashes(frame):
+    """engine.to_frame の各行 (計算に効く値だけ) のハッシュ。メモだけが違う設定は同じ結果を共有する"""
+    values = frame[engine.INPUT_KEYS].to_numpy(dtype=float)
+    return [_hash([round(v, 6) for v in row]) for row in values.tolist()]
+
+
+class ScenarioStore:
+    """シナリオの保存・一覧・読込・版履歴と、計算結果のキャッシュ"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with self._connect() as con:
+            con.executescript(SCHEMA)
+            # 計算式の版が違う結果は二度と使わないので消しておく
+            con.execute("DELETE FROM results WHERE substr(input_hash, 1, ?) != ?",
+                        (len(RESULT_PREFIX), RESULT_PREFIX))
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # Streamlit のスレッドごとに開き直す (接続は使い回さない)
+        con = sqlite3.connect(self.path, timeout=10)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            with con:  # 抜けるときにコミット (例外ならロールバック)
+                yield con
+        finally:
+            con.close()
+
+    # --- 保存・読込 ---
+    def save(self, name, config, creator="", note=""):
+        """設定を新しい版として保存し、版番号を返す。直前の版と同じ内容なら保存しない"""
+        normalized, errors, _ = schema.validate(config)
+        if errors:
+            raise ValueError(" / ".join(errors))
+        c_hash = _hash(normalized)  # メモ等も含めた内容のハッシュ (同じ内容の版は重複保存しない)
+        i_hash = input_hashes(engine.to_frame([normalized]))[0]
+        now = _now()
+        with self._connect() as con:
+            # 最新版の確認から書き込みまでを1つの書き込みトランザクションにする
+            # (同じ名前を同時に保存しても版番号が重ならない。待ちは timeout 秒まで)
+            con.execute("BEGIN IMMEDIATE")
+            row = con.execute("SELECT id, latest_version FROM scenarios WHERE name = ?", (name,)).fetchone()
+            if row:
+                scenario_id, latest = row
+                last_hash = con.execute(
+                    "SELECT config_hash FROM versions WHERE scenario_id = ? AND version = ?",
+                    (scenario_id, latest)).fetchone()[0]
+                if last_hash == c_hash:
+                    return latest
+                version = latest + 1
+                con.execute("UPDATE scenarios SET latest_version = ?, creator = ?, updated_at = ? WHERE id = ?",
+                            (version, creator, now, scenario_id))
+            else:
+                version = 1
+                scenario_id = con.execute(
+                    "INSERT INTO scenarios (name, creator, latest_version, updated_at) VALUES (?, ?, ?, ?)",
+                    (name, creator, version, now)).lastrowid
+            con.execute(
+                "INSERT INTO versions (scenario_id, version, config_json, config_hash, input_hash, creator, note, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (scenario_id, version, json.dumps(schema.tag(normalized), ensure_ascii=False), c_hash, i_hash, creator, note, now))
+        return version
+
+    def list(self):
+        """シナリオ一覧 (メタデータのみ)"""
+        with self._connect() as con:
+            return pd.read_sql_query(
+                "SELECT name, creator, latest_version, updated_at FROM scenarios ORDER BY updated_at DESC", con)
+
+    def history(self, name):
+        """シナリオの版履歴 (メタデータのみ)"""
+        with self._connect() as con:
+            return pd.read_sql_query(
+                "SELECT v.version, v.creator, v.note, v.created_at FROM versions v"
+                " JOIN scenarios s ON s.id = v.scenario_id WHERE s.name = ? ORDER BY v.version DESC",
+                con, params=(name,))
+
+    def load(self, name, version=None):
+        """設定を読み込む (version 省略時は最新版)"""
+        with self._connect() as con:
+            row = con.execute(
+                "SELECT v.config_json FROM versions v JOIN scenarios s ON s.id = v.scenario_id"
+                " WHERE s.name = ? AND v.version = COALESCE(?, s.latest_version)",
+                (name, version)).fetchone()
+        if row is None:
+            raise KeyError(f"{name} (版 {version or '最新'}) は保存されていません")
+        config, errors, _ = schema.validate(json.loads(row[0]))  # 古い版で保存したものは現在の形に移行する
+        if errors:
+            raise ValueError(" / ".join(errors))
+        return config
+
+    # --- 計算結果のキャッシュ ---
+    def results(self, configs):
+        """{名前: 設定} の計算結果を返す。保存済みの結果は読むだけで、未計算のものだけ一括計算して保存する。
+
+        結果は共有して溜まっていくので、保存済みシナリオの設定にだけ使う (編集中の画面の設定などは渡さない)。
+        """
+        frame = engine.to_frame(list(configs.values()))
+        frame.index = pd.Index(list(configs), name="scenario")
+        hashes = [RESULT_PREFIX + h for h in input_hashes(frame)]
+        unique = sorted(set(hashes))
+
+        cached = {}
+        with self._connect() as con:
+            for i in range(0, len(unique), 500):  # SQLite のプレースホルダ上限対策
+                part = unique[i:i + 500]
+                rows = con.execute(
+                    f"SELECT input_hash, result_json FROM results WHERE input_hash IN ({','.join('?' * len(part))})",
+                    part).fetchall()
+                cached.update((h, json.loads(r)) for h, r in rows)
+
+            missing = [i for i, h in enumerate(hashes) if h not in cached]
+            if missing:
+                computed = engine.evaluate(frame.iloc[missing])
+                now = _now()
+                new_rows = {}
+                for h, (_, r) in zip([hashes[i] for i in missing], computed.iterrows()):
+                    cached[h] = new_rows[h] = r.to_dict()
+                con.executemany("INSERT OR IGNORE INTO results (input_hash, result_json, created_at) VALUES (?, ?, ?)",
+                                [(h, json.dumps(r), now) for h, r in new_rows.items()])
+
+        return pd.DataFrame([cached[h] for h in hashes], index=frame.index, columns=engine.RESULT_KEYS)
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+import engine
+
+# ==========================================
+# パラメータスイープ・感度分析
+# ==========================================
+# 1〜2個の入力に範囲を与えたグリッドと、全パラメータの ±X% 感度(トルネード図)を
+# engine.compute() のブロードキャストで一度に計算する。
+
+
+def _base_params(base):
+    return {k: float(base[k]) for k in engine.INPUT_KEYS}
+
+
+def grid(base, x_key, x_values, y_key=None, y_values=None):
+    """x_key (と y_key) を振ったグリッドの計算結果を返す。
+
+    戻り値は engine.RESULT_KEYS ごとの配列で、形は (len(x_values),) または
+    (len(x_values), len(y_values))。
+    """
+    params = _base_params(base)
+    xs = np.asarray(x_values, dtype=float)
+    if y_key:
+        ys = np.asarray(y_values, dtype=float)
+        params[x_key] = xs[:, None]
+        params[y_key] = ys[None, :]
+        shape = (len(xs), len(ys))
+    else:
+        params[x_key] = xs
+        shape = (len(xs),)
+    result = engine.compute(params)
+    return {k: np.broadcast_to(v, shape) for k, v in result.items()}
+
+
+def grid_frame(base, x_key, x_values, y_key=None, y_values=None):
+    """grid() の結果を1行1グリッド点の DataFrame にする"""
+    result = grid(base, x_key, x_values, y_key, y_values)
+    if y_key:
+        xx, yy = np.meshgrid(np.asarray(x_values, dtype=float), np.asarray(y_values, dtype=float), indexing="ij")
+        frame = pd.DataFrame({x_key: xx.ravel(), y_key: yy.ravel()})
+    else:
+        frame = pd.DataFrame({x_key: np.asarray(x_values, dtype=float)})
+    for k in engine.RESULT_KEYS:
+        frame[k] = result[k].ravel()
+    return frame
+
+
+def tornado(base, pct=10, keys=None):
+    """各パラメータを ±pct% 動かしたときの profit の変化を、影響の大きい順に返す。
+
+    全パラメータ×(下振れ, 上振れ) を1つの配列にまとめて一括計算する。
+    %指定の項目は 0〜100 に収める。
+    """
+    keys = list(keys or engine.NUMERIC_KEYS)
+    params = _base_params(base)
+    base_profit = float(engine.compute(params)["profit"])
+
+    n = len(keys)
+    factors = np.array([1 - pct / 100, 1 + pct / 100])
+    cols = {k: np.full((n, 2), v) for k, v in params.items()}
+    for i, k in enumerate(keys):
+        cols[k][i] = params[k] * factors
+        if k in engine.PERCENT_KEYS:
+            np.clip(cols[k][i], 0, 100, out=cols[k][i])
+    profit = engine.compute(cols)["profit"]
+
+    frame = pd.DataFrame({
+        "key": keys,
+        "項目": [engine.PARAM_LABELS.get(k, k) for k in keys],
+        "base": [params[k] for k in keys],
+        "low_profit": profit[:, 0],
+        "high_profit": profit[:, 1],
+    })
+    frame["low_delta"] = frame["low_profit"] - base_profit
+    frame["high_delta"] = frame["high_profit"] - base_profit
+    frame["swing"] = (frame["high_profit"] - frame["low_profit"]).abs()
+    return frame.sort_values("swing", ascending=False, kind="stable").reset_index(drop=True)